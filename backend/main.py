@@ -1,20 +1,57 @@
 from fastapi import FastAPI, APIRouter
 from fastapi.staticfiles import StaticFiles
+from fastapi.responses import JSONResponse
 from routes.auth import router as auth_router
 from routes.chat import router as chat_router
+from routes.media import router as media_router
+from routes.stats import router as stats_router
 from contextlib import asynccontextmanager
-from utils.dbUtils import get_client, close_client
+from utils.dbUtils import connect_client, close_client, get_client
+from utils.indexes import bootstrap_indexes
+from utils.inbox import backfill_inboxes
+from utils.mail import start_mail_dispatcher, stop_mail_dispatcher
+from utils.image_variants import start_variant_pool, shutdown_variant_pool
+from utils.file_handling import RequestSizeLimitMiddleware
+from utils.deletion import start_deletion_worker, stop_deletion_worker
+from utils.serialization import FAST_JSON, BSONJSONResponse
+from utils.typing_indicators import start_typing_flusher, stop_typing_flusher
+from utils.presence import start_presence_tracker, stop_presence_tracker
 from dotenv import load_dotenv
 from fastapi.security import OAuth2PasswordBearer
 import socketio
-from utils.socket_events import create_socket_events, get_socketio
+from utils.socket_events import create_socket_events, get_socketio, start_client_manager
 from fastapi.middleware.cors import CORSMiddleware
 
 load_dotenv()
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    connect_client()
+    await bootstrap_indexes(get_client())
+    await backfill_inboxes(get_client())
+    start_mail_dispatcher(get_client())
+    start_deletion_worker(get_client())
+    start_typing_flusher(sio)
+    start_presence_tracker(get_client(), sio)
+    start_client_manager(sio)
+    start_variant_pool()
+    yield
+    await stop_presence_tracker()
+    await stop_typing_flusher()
+    await stop_deletion_worker()
+    await stop_mail_dispatcher()
+    shutdown_variant_pool()
+    close_client()
+
+
 app = FastAPI(
-    root_path="/chat"
+    root_path="/chat",
+    lifespan=lifespan,
+    default_response_class=BSONJSONResponse if FAST_JSON else JSONResponse,
 )
+# Added first so it runs inside CORS and its 413 responses carry CORS headers.
+app.add_middleware(RequestSizeLimitMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=[
@@ -27,9 +64,12 @@ app.add_middleware(
     allow_headers=["*"]
 )
 sio = get_socketio()
+create_socket_events(sio)
 socket_app = socketio.ASGIApp(socketio_server=sio, other_asgi_app=app)
 app.mount("/images", StaticFiles(directory="./public/images"), name="images")
 app.mount('/socket', socket_app)
 
 app.include_router(auth_router, prefix="/users", tags=["Authentications"])
 app.include_router(chat_router, prefix="/chat-app", tags=["Chat"])
+app.include_router(media_router, prefix="/media", tags=["Media"])
+app.include_router(stats_router, prefix="/stats", tags=["Stats"])
@@ -34,6 +34,9 @@ class Attachment(BaseModel):
     id : Annotated[PyObjectId, Field(default_factory=PyObjectId ,alias="_id")]
     url: str
     localPath: str
+    hash: str | None = None
+    size: int | None = None
+    variants: Annotated[dict[str, str], Field(default_factory=dict)]
     
     class Config:
         json_encoders = {
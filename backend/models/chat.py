@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
 from typing import Annotated
 from datetime import datetime
 from enum import Enum
@@ -15,6 +15,13 @@ class ChatEventType(str, Enum):
     SOCKET_ERROR_EVENT = 'socketError'
     STOP_TYPING_EVENT = 'stopTyping'
     TYPING_EVENT = 'typing'
+    MARK_READ_EVENT = 'markRead'
+    MESSAGE_READ_EVENT = 'messageRead'
+    SEND_MESSAGE_EVENT = 'sendMessage'
+    TYPING_USERS_EVENT = 'typingUsers'
+    HEARTBEAT_EVENT = 'heartbeat'
+    PRESENCE_EVENT = 'presence'
+    REPLAY_EVENT = 'replay'
 
 class ChatUser(BaseModel):
     id: Annotated[PyObjectId, Field(default_factory=PyObjectId, alias='_id')]
@@ -31,6 +38,7 @@ class Message(BaseModel):
     content: str
     attachments: Annotated[list[Attachment], Field(default_factory=list)]
     chat: Annotated[PyObjectId, Field(default_factory=PyObjectId)]
+    clientMessageId: str | None = None
 
 class Chat(BaseModel):
     id: Annotated[PyObjectId, Field(default_factory=PyObjectId, alias='_id')]
@@ -44,3 +52,50 @@ class Chat(BaseModel):
 
 class ChatWithLastMessage(Chat):
     lastMessage: Message | None = None
+
+class ChatListItem(BaseModel):
+    id: Annotated[PyObjectId, Field(default_factory=PyObjectId, alias='_id')]
+    v: Annotated[int, Field(alias='__v')] = 0
+    name: str
+    isGroupChat: bool
+    participants: Annotated[list[ChatUser], Field(default_factory=list)]
+    admin: Annotated[PyObjectId, Field(default_factory=PyObjectId)]
+    createdAt: datetime
+    updatedAt: datetime
+    lastMessage: Message | None = None
+    unreadCount: int = 0
+    lastReadMessage: PyObjectId | None = None
+
+class ChatChanges(BaseModel):
+    chats: list[ChatListItem]
+    removed: list[PyObjectId]
+    version: int
+
+class Presence(BaseModel):
+    userId: PyObjectId
+    online: bool | None  # None when sockets are spread over several workers
+    lastSeen: datetime | None = None
+
+class ReadReceipt(BaseModel):
+    chatId: PyObjectId
+    userId: PyObjectId
+    lastReadMessage: PyObjectId
+    unreadCount: int
+
+class SendMessagePayload(BaseModel):
+    chatId: str
+    content: str
+    clientMessageId: str | None = None
+
+class MarkReadPayload(BaseModel):
+    chatId: str
+    messageId: str | None = None
+
+class JoinChatPayload(BaseModel):
+    chatId: Annotated[str, Field(min_length=1)]
+
+    @model_validator(mode="before")
+    @classmethod
+    def from_chat_id(cls, data):
+        # Clients send the bare chat id rather than an object.
+        return {"chatId": data} if isinstance(data, str) else data
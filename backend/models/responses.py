@@ -1,6 +1,6 @@
 from pydantic import BaseModel
 from models.auth import UserResponse
-from models.chat import Chat, ChatUser, ChatWithLastMessage, Message
+from models.chat import Chat, ChatUser, ChatWithLastMessage, ChatListItem, ChatChanges, Message, Presence, ReadReceipt
 
 
 class BaseResponse(BaseModel):
@@ -41,11 +41,17 @@ class LoginResponse(BaseResponse):
 
 
 class AllChatResponse(BaseResponse):
-    data: list[ChatWithLastMessage]
+    data: list[ChatListItem]
+    version: int | None = None
+
+
+class ChatChangesResponse(BaseResponse):
+    data: ChatChanges
 
 
 class AvailableUsersResponse(BaseResponse):
     data: list[ChatUser]
+    nextCursor: str | None = None
 
 
 class ChatResponse(BaseResponse):
@@ -67,6 +73,13 @@ class UpdateGroupNameRequest(BaseModel):
 
 class AllMessagesResponse(BaseResponse):
     data: list[Message]
+    nextCursor: str | None = None
 
 class SendMessageResponse(BaseResponse):
     data: Message
+
+class ReadReceiptResponse(BaseResponse):
+    data: ReadReceipt
+
+class PresenceResponse(BaseResponse):
+    data: list[Presence]
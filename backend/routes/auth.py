@@ -9,8 +9,10 @@ from models.responses import (
 )
 from utils.dbUtils import get_client
 from typing import Annotated
-from pymongo import MongoClient
+from motor.motor_asyncio import AsyncIOMotorDatabase
 from datetime import timedelta
+from socketio import AsyncServer
+from utils.socket_events import get_socketio
 from utils.auth import (
     register_user,
     get_current_user,
@@ -29,14 +31,14 @@ router = APIRouter()
 
 @router.post("/register")
 async def register(
-    user: UserRegister, request: Request, db: Annotated[MongoClient, Depends(get_client)]
+    user: UserRegister, request: Request, db: Annotated[AsyncIOMotorDatabase, Depends(get_client)]
 ) -> RegisterAndCurrentUserResponse:
     return await register_user(user, request, db)
 
 
 @router.post("/login")
 async def login(
-    user: UserLogin, response: Response, db: Annotated[MongoClient, Depends(get_client)]
+    user: UserLogin, response: Response, db: Annotated[AsyncIOMotorDatabase, Depends(get_client)]
 ) -> LoginResponse:
     return await login_user(user, response, db)
 
@@ -44,7 +46,7 @@ async def login(
 @router.get("/verify-email/{verification_token}")
 async def verify(
     verification_token: str,
-    db: Annotated[MongoClient, Depends(get_client)]
+    db: Annotated[AsyncIOMotorDatabase, Depends(get_client)]
 ) -> EmailVerificationResponse:
     if not verification_token:
         raise HTTPException(
@@ -55,7 +57,7 @@ async def verify(
 
 @router.post("/refresh-token")
 async def refresh_token(
-    db: Annotated[MongoClient, Depends(get_client)],
+    db: Annotated[AsyncIOMotorDatabase, Depends(get_client)],
     response: Response,
     refreshToken: str = Cookie(None),
 ) -> RefreshTokenResponse:
@@ -64,20 +66,23 @@ async def refresh_token(
 
 @router.post("/forgot-password")
 async def forgot(
-    email: str, request: Request, db: Annotated[MongoClient, Depends(get_client)]
+    email: str, request: Request, db: Annotated[AsyncIOMotorDatabase, Depends(get_client)]
 ) -> BaseResponse:
     return await forgot_password(email, request, db)
 
 
 @router.post("/reset-password/{reset_token}")
-async def reset_password(
-    reset_token: str, password: str, db: MongoClient = Depends(get_client)
+async def reset(
+    reset_token: str,
+    password: str,
+    db: AsyncIOMotorDatabase = Depends(get_client),
+    sio: AsyncServer = Depends(get_socketio),
 ) -> EmailVerificationResponse:
     if not reset_token:
         raise HTTPException(status_code=400, detail="Reset token is required")
     if not password:
         raise HTTPException(status_code=400, detail="Password is required")
-    return await reset_password(reset_token, password, db)
+    return await reset_password(reset_token, password, sio, db)
 
 
 # secured routes
@@ -85,15 +90,16 @@ async def reset_password(
 async def logout(
     token: Annotated[dict, Depends(verify_and_return_token)],
     response: Response,
-    db: Annotated[MongoClient, Depends(get_client)],
+    db: Annotated[AsyncIOMotorDatabase, Depends(get_client)],
+    sio: AsyncServer = Depends(get_socketio),
 ) -> BaseResponse:
-    return await logout_user(token, response, db)
+    return await logout_user(token, response, db, sio)
 
 
 @router.get("/current-user")
 async def read_users_me(
     token: Annotated[dict, Depends(verify_and_return_token)],
-    db: Annotated[MongoClient, Depends(get_client)],
+    db: Annotated[AsyncIOMotorDatabase, Depends(get_client)],
 ) -> RegisterAndCurrentUserResponse:
     return await get_current_user(token, db)
 
@@ -102,14 +108,15 @@ async def change(
     old_password: str,
     new_password: str,
     token: Annotated[dict, Depends(verify_and_return_token)],
-    db: Annotated[MongoClient, Depends(get_client)],
+    db: Annotated[AsyncIOMotorDatabase, Depends(get_client)],
+    sio: AsyncServer = Depends(get_socketio),
 ) -> BaseResponse:
-    return await change_password(token, old_password, new_password, db)
+    return await change_password(token, old_password, new_password, sio, db)
 
 @router.post("/resent-email-verification")
 async def re_verify_email(
     token: Annotated[dict, Depends(verify_and_return_token)],
     request: Request,
-    db: Annotated[MongoClient, Depends(get_client)],
+    db: Annotated[AsyncIOMotorDatabase, Depends(get_client)],
 ) -> BaseResponse:
     return await resend_email_verification(token, request, db)
@@ -1,6 +1,6 @@
-from fastapi import APIRouter, Request, Depends, Form, Body, File, UploadFile
+from fastapi import APIRouter, Request, Depends, Form, Body, File, UploadFile, Query
 from typing import Annotated
-from pymongo import MongoClient
+from motor.motor_asyncio import AsyncIOMotorDatabase
 from utils.chat import (
     get_all_messages,
     search_available_users,
@@ -15,6 +15,9 @@ from utils.chat import (
     leave_group_chat,
     get_all_messages_for_chat,
     send_message_to_chat,
+    mark_chat_as_read,
+    get_users_presence,
+    get_chat_changes,
 )
 from utils.dbUtils import get_client
 from models.responses import (
@@ -27,6 +30,9 @@ from models.responses import (
     ChatWithoutLastMessageResponse,
     AllMessagesResponse,
     SendMessageResponse,
+    ReadReceiptResponse,
+    PresenceResponse,
+    ChatChangesResponse,
 )
 from models.auth import UserResponse
 from utils.auth import verify_and_return_token
@@ -40,24 +46,45 @@ router = APIRouter()
 @router.get("/chats")
 async def get_all(
     token: Annotated[dict, Depends(verify_and_return_token)],
-    db: Annotated[MongoClient, Depends(get_client)],
+    db: Annotated[AsyncIOMotorDatabase, Depends(get_client)],
 ) -> AllChatResponse:
     return await get_all_messages(token, db)
 
 
+@router.get("/chats/changes")
+async def chat_changes(
+    token: Annotated[dict, Depends(verify_and_return_token)],
+    db: Annotated[AsyncIOMotorDatabase, Depends(get_client)],
+    since: Annotated[int, Query(ge=0)] = 0,
+) -> ChatChangesResponse:
+    return await get_chat_changes(token, since, db)
+
+
 @router.get("/chats/users")
 async def users(
     token: Annotated[dict, Depends(verify_and_return_token)],
-    db: Annotated[MongoClient, Depends(get_client)],
+    db: Annotated[AsyncIOMotorDatabase, Depends(get_client)],
+    q: Annotated[str | None, Query(max_length=50)] = None,
+    cursor: str | None = None,
+    limit: Annotated[int, Query(ge=1, le=50)] = 20,
 ) -> AvailableUsersResponse:
-    return await search_available_users(token, db)
+    return await search_available_users(token, db, q, cursor, limit)
+
+
+@router.get("/presence")
+async def presence(
+    token: Annotated[dict, Depends(verify_and_return_token)],
+    db: Annotated[AsyncIOMotorDatabase, Depends(get_client)],
+    userIds: Annotated[list[str], Query(max_length=100)],
+) -> PresenceResponse:
+    return await get_users_presence(token, userIds, db)
 
 
 @router.post("/chats/c/{receiverId}")
 async def create_or_get_chat(
     token: Annotated[dict, Depends(verify_and_return_token)],
     receiverId: str,
-    db: Annotated[MongoClient, Depends(get_client)],
+    db: Annotated[AsyncIOMotorDatabase, Depends(get_client)],
     sio: AsyncServer = Depends(get_socketio),
 ) -> ChatResponse:
     return await create_or_get_one_on_one_chat(token, receiverId, db, sio)
@@ -67,7 +94,7 @@ async def create_or_get_chat(
 async def create_group(
     token: Annotated[dict, Depends(verify_and_return_token)],
     req: CreateGroupChatRequest,
-    db: Annotated[MongoClient, Depends(get_client)],
+    db: Annotated[AsyncIOMotorDatabase, Depends(get_client)],
     sio: AsyncServer = Depends(get_socketio),
 ):
     return await create_group_chat(token, req, db, sio)
@@ -77,7 +104,7 @@ async def create_group(
 async def remove_chat(
     token: Annotated[dict, Depends(verify_and_return_token)],
     chatId: str,
-    db: Annotated[MongoClient, Depends(get_client)],
+    db: Annotated[AsyncIOMotorDatabase, Depends(get_client)],
     sio: AsyncServer = Depends(get_socketio),
 ) -> BaseResponse:
     return await remove_one_on_one_chat(token, chatId, db, sio)
@@ -87,7 +114,7 @@ async def remove_chat(
 async def group_chat(
     token: Annotated[dict, Depends(verify_and_return_token)],
     chatId: str,
-    db: Annotated[MongoClient, Depends(get_client)],
+    db: Annotated[AsyncIOMotorDatabase, Depends(get_client)],
 ):
     return await get_group_chat_details(token, chatId, db)
 
@@ -96,7 +123,7 @@ async def group_chat(
 async def delete_chat(
     token: Annotated[dict, Depends(verify_and_return_token)],
     chatId: str,
-    db: Annotated[MongoClient, Depends(get_client)],
+    db: Annotated[AsyncIOMotorDatabase, Depends(get_client)],
     sio: AsyncServer = Depends(get_socketio),
 ) -> BaseResponse:
     return await delete_group_chat(token, chatId, db, sio)
@@ -107,7 +134,7 @@ async def update_name(
     token: Annotated[dict, Depends(verify_and_return_token)],
     chatId: str,
     request_body: UpdateGroupNameRequest,
-    db: Annotated[MongoClient, Depends(get_client)],
+    db: Annotated[AsyncIOMotorDatabase, Depends(get_client)],
     sio: AsyncServer = Depends(get_socketio),
 ) -> ChatWithoutLastMessageResponse:
     return await update_group_name(token, chatId, request_body.name, db, sio)
@@ -118,7 +145,7 @@ async def add_participant(
     token: Annotated[dict, Depends(verify_and_return_token)],
     chatId: str,
     participantId: str,
-    db: Annotated[MongoClient, Depends(get_client)],
+    db: Annotated[AsyncIOMotorDatabase, Depends(get_client)],
     sio: AsyncServer = Depends(get_socketio),
 ) -> ChatWithoutLastMessageResponse:
     return await add_participant_to_group(token, chatId, participantId, db, sio)
@@ -129,7 +156,7 @@ async def remove_participant(
     token: Annotated[dict, Depends(verify_and_return_token)],
     chatId: str,
     participantId: str,
-    db: Annotated[MongoClient, Depends(get_client)],
+    db: Annotated[AsyncIOMotorDatabase, Depends(get_client)],
     sio: AsyncServer = Depends(get_socketio),
 ) -> ChatWithoutLastMessageResponse:
     return await remove_participant_from_group(token, chatId, participantId, db, sio)
@@ -139,19 +166,33 @@ async def remove_participant(
 async def leave_group(
     token: Annotated[dict, Depends(verify_and_return_token)],
     chatId: str,
-    db: Annotated[MongoClient, Depends(get_client)],
+    db: Annotated[AsyncIOMotorDatabase, Depends(get_client)],
     sio: AsyncServer = Depends(get_socketio),
 ):
-    return await leave_group_chat(token, chatId, token.get("_id"), db, sio)
+    return await leave_group_chat(token, chatId, db, sio)
+
+
+@router.post("/chats/{chatId}/read")
+async def mark_read(
+    token: Annotated[dict, Depends(verify_and_return_token)],
+    chatId: str,
+    db: Annotated[AsyncIOMotorDatabase, Depends(get_client)],
+    sio: Annotated[AsyncServer, Depends(get_socketio)],
+    messageId: str | None = None,
+) -> ReadReceiptResponse:
+    return await mark_chat_as_read(token, chatId, messageId, db, sio)
 
 
 @router.get("/messages/{chatId}")
 async def get_messages(
     token: Annotated[dict, Depends(verify_and_return_token)],
     chatId: str,
-    db: Annotated[MongoClient, Depends(get_client)],
+    db: Annotated[AsyncIOMotorDatabase, Depends(get_client)],
+    before: str | None = None,
+    after: str | None = None,
+    limit: Annotated[int, Query(ge=1, le=100)] = 50,
 ) -> AllMessagesResponse:
-    return await get_all_messages_for_chat(token, chatId, db)
+    return await get_all_messages_for_chat(token, chatId, db, before, after, limit)
 
 
 @router.post("/messages/{chatId}")
@@ -159,9 +200,12 @@ async def send_message(
     token: Annotated[dict, Depends(verify_and_return_token)],
     chatId: str,
     content: Annotated[str, Body()],
-    db: Annotated[MongoClient, Depends(get_client)],
+    db: Annotated[AsyncIOMotorDatabase, Depends(get_client)],
     sio: Annotated[AsyncServer, Depends(get_socketio)],
     request: Request,
     attachments: Annotated[list[UploadFile], File()],
+    clientMessageId: Annotated[str | None, Body()] = None,
 ) -> SendMessageResponse:
-    return await send_message_to_chat(token, chatId, content, attachments, db, sio, request)
\ No newline at end of file
+    return await send_message_to_chat(
+        token, chatId, content, attachments, db, sio, request, clientMessageId
+    )
\ No newline at end of file
@@ -0,0 +1,13 @@
+from fastapi import APIRouter, HTTPException, Request
+from utils.image_variants import media_path
+from utils.media import media_response
+
+router = APIRouter()
+
+
+@router.get("/{filename}")
+async def get_media(filename: str, request: Request, size: str | None = None):
+    path = media_path(filename, size)
+    if path is None:
+        raise HTTPException(status_code=404, detail="File does not exist")
+    return media_response(request, path)
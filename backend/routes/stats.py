@@ -0,0 +1,18 @@
+from fastapi import APIRouter, Depends
+from typing import Annotated
+from utils.auth import verify_and_return_token
+from utils.passwords import password_pool_stats
+from utils.token_cache import token_cache_stats
+from utils.typing_indicators import typing_stats
+
+router = APIRouter()
+
+
+@router.get("")
+async def get_stats(token: Annotated[dict, Depends(verify_and_return_token)]) -> dict:
+    # Counters are kept per process; each worker reports only its own.
+    return {
+        "typing": typing_stats(),
+        "tokenCache": token_cache_stats(),
+        "passwordPool": password_pool_stats(),
+    }
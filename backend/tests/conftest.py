@@ -0,0 +1,23 @@
+import pytest
+
+
+class FakeClock:
+    """Stands in for the time module of code that reads time.monotonic()."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def fake_time(monkeypatch):
+    """Replace a module's time with a FakeClock and return the clock."""
+
+    def patch(module) -> FakeClock:
+        clock = FakeClock()
+        monkeypatch.setattr(module, "time", clock)
+        return clock
+
+    return patch
@@ -0,0 +1,64 @@
+import pytest
+from utils import cache
+from utils.cache import TTLCache
+
+
+@pytest.fixture
+def clock(fake_time):
+    return fake_time(cache)
+
+
+def test_get_returns_default_for_missing_key(clock):
+    entries = TTLCache(maxsize=2, ttl=10)
+    assert entries.get("a") is None
+    assert entries.get("a", 1) == 1
+    assert entries.stats()["misses"] == 2
+
+
+def test_entries_expire_after_ttl(clock):
+    entries = TTLCache(maxsize=2, ttl=10)
+    entries.set("a", 1)
+    clock.now += 9.9
+    assert entries.get("a") == 1
+    clock.now += 0.1
+    assert entries.get("a") is None
+    assert entries.stats() == {"size": 0, "maxsize": 2, "hits": 1, "misses": 1}
+
+
+def test_per_entry_ttl_is_capped_by_default_ttl(clock):
+    entries = TTLCache(maxsize=2, ttl=10)
+    entries.set("short", 1, ttl=5)
+    entries.set("long", 2, ttl=60)
+    clock.now += 5
+    assert entries.get("short") is None
+    assert entries.get("long") == 2
+    clock.now += 5
+    assert entries.get("long") is None
+
+
+def test_non_positive_ttl_is_not_stored(clock):
+    entries = TTLCache(maxsize=2, ttl=10)
+    entries.set("a", 1, ttl=0)
+    entries.set("b", 2, ttl=-1)
+    assert entries.stats()["size"] == 0
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    entries = TTLCache(maxsize=2, ttl=10)
+    entries.set("a", 1)
+    entries.set("b", 2)
+    entries.get("a")
+    entries.set("c", 3)
+    assert entries.get("b") is None
+    assert entries.get("a") == 1
+    assert entries.get("c") == 3
+
+
+def test_pop_and_clear(clock):
+    entries = TTLCache(maxsize=2, ttl=10)
+    entries.set("a", 1)
+    entries.set("b", 2)
+    assert entries.pop("a") == 1
+    assert entries.pop("a") is None
+    entries.clear()
+    assert entries.get("b") is None
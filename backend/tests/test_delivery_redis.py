@@ -0,0 +1,172 @@
+"""Delivery across two uvicorn workers sharing a Redis message queue.
+
+Starts two real server processes and connects a socket.io client to each. Needs
+a Redis server and a disposable MongoDB; the test writes users and a chat to the
+cyphertalk database:
+
+    REDIS_URL=redis://... DATABASE_URI=mongodb://... python -m pytest -m redis
+"""
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+import httpx
+import pytest
+import socketio
+from bson import ObjectId
+from jose import jwt
+from pymongo import MongoClient
+
+REDIS_URL = os.environ.get("REDIS_URL", "redis://localhost:6379/15")
+DATABASE_URI = os.environ.get("DATABASE_URI", "mongodb://localhost:27017")
+ACCESS_TOKEN_SECRET = "delivery-test-secret"
+SOCKET_PATH = "/socket/socket.io"
+BACKEND_DIRECTORY = Path(__file__).resolve().parent.parent
+
+pytestmark = pytest.mark.redis
+
+
+def free_port() -> int:
+    with socket.socket() as listener:
+        listener.bind(("127.0.0.1", 0))
+        return listener.getsockname()[1]
+
+
+def start_worker(port: int, channel: str) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "SOCKET_MESSAGE_QUEUE": REDIS_URL,
+        "SOCKET_CHANNEL": channel,
+        "DATABASE_URI": DATABASE_URI,
+        "ACCESS_TOKEN_SECRET": ACCESS_TOKEN_SECRET,
+        "ACCESS_TOKEN_EXPIRE_MINUTES": "15",
+        "REFRESH_TOKEN_SECRET": "delivery-test-refresh-secret",
+        "REFRESH_TOKEN_EXPIRY": "1",
+    }
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port)],
+        cwd=BACKEND_DIRECTORY,
+        env=env,
+    )
+
+
+async def wait_until_serving(url: str, worker: subprocess.Popen):
+    async with httpx.AsyncClient() as client:
+        for _ in range(100):
+            assert worker.poll() is None, "worker exited during startup"
+            try:
+                await client.get(f"{url}/docs")
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.2)
+    raise TimeoutError(f"{url} did not start")
+
+
+def create_user(db, username: str) -> tuple[ObjectId, str]:
+    user_id = ObjectId()
+    now = datetime.now()
+    db.users.insert_one(
+        {
+            "_id": user_id,
+            "username": username,
+            "email": f"{username}@example.com",
+            "avatar": {"_id": ObjectId(), "url": "", "localPath": ""},
+            "role": "USER",
+            "loginType": "EMAIL_PASSWORD",
+            "isEmailVerified": True,
+            "createdAt": now,
+            "updatedAt": now,
+        }
+    )
+    token = jwt.encode(
+        {
+            "_id": str(user_id),
+            "username": username,
+            "email": f"{username}@example.com",
+            "role": "USER",
+            "exp": int(time.time()) + 900,
+            "iat": time.time(),
+        },
+        ACCESS_TOKEN_SECRET,
+        algorithm="HS256",
+    )
+    return user_id, token
+
+
+async def connect(url: str, token: str) -> socketio.AsyncClient:
+    client = socketio.AsyncClient()
+    await client.connect(
+        url, socketio_path=SOCKET_PATH, auth={"token": token}, transports=["websocket"]
+    )
+    return client
+
+
+def test_message_reaches_a_socket_connected_to_another_worker():
+    db = MongoClient(DATABASE_URI).cyphertalk
+    suffix = uuid.uuid4().hex[:8]
+    alice_id, alice_token = create_user(db, f"alice{suffix}")
+    bob_id, bob_token = create_user(db, f"bob{suffix}")
+    channel = f"test-{uuid.uuid4().hex}"
+    sender_url = f"http://127.0.0.1:{free_port()}"
+    receiver_url = f"http://127.0.0.1:{free_port()}"
+    workers = [
+        start_worker(int(url.rsplit(":", 1)[1]), channel)
+        for url in (sender_url, receiver_url)
+    ]
+    chat_id = None
+
+    async def run():
+        nonlocal chat_id
+        for url, worker in zip((sender_url, receiver_url), workers):
+            await wait_until_serving(url, worker)
+
+        async with httpx.AsyncClient(cookies={"accessToken": alice_token}) as client:
+            response = await client.post(f"{sender_url}/chat-app/chats/c/{bob_id}")
+        assert response.status_code == 200, response.text
+        chat_id = response.json()["data"]["_id"]
+
+        # Bob is connected to the receiving worker only; Alice sends on the other.
+        bob = await connect(receiver_url, bob_token)
+        alice = await connect(sender_url, alice_token)
+        received = asyncio.Queue()
+        bob.on("messageReceived", received.put_nowait)
+        try:
+            # The receiver subscribes to the channel in the background after its
+            # first connection, and Redis drops what is published before that.
+            for attempt in range(20):
+                ack = await alice.call(
+                    "sendMessage", {"chatId": chat_id, "content": f"hi {attempt}"}
+                )
+                assert ack["success"], ack
+                try:
+                    message = await asyncio.wait_for(received.get(), timeout=0.5)
+                    break
+                except asyncio.TimeoutError:
+                    continue
+            else:
+                pytest.fail("the message never reached the other worker")
+            assert message["chat"] == chat_id
+            assert message["sender"]["_id"] == str(alice_id)
+            assert message["content"].startswith("hi ")
+        finally:
+            await asyncio.gather(alice.disconnect(), bob.disconnect())
+
+    try:
+        asyncio.run(run())
+    finally:
+        for worker in workers:
+            worker.terminate()
+        for worker in workers:
+            worker.wait(timeout=10)
+        db.users.delete_many({"_id": {"$in": [alice_id, bob_id]}})
+        if chat_id is not None:
+            db.chats.delete_one({"_id": ObjectId(chat_id)})
+            db.chatmessages.delete_many({"chat": ObjectId(chat_id)})
+            db.inboxes.delete_many({"chat": ObjectId(chat_id)})
+        db.deliverylog.delete_many({"users": {"$in": [alice_id, bob_id]}})
+        db.client.close()
@@ -0,0 +1,50 @@
+import pytest
+from pydantic import ValidationError
+from models.chat import JoinChatPayload
+from utils import presence
+from utils.membership import chat_fanout
+from utils.presence import register_sid
+
+
+@pytest.fixture(autouse=True)
+def sockets():
+    for state in (presence.user_sids, presence.sid_users, presence.sid_heartbeats, presence.presence_changes):
+        state.clear()
+    yield
+    for state in (presence.user_sids, presence.sid_users, presence.sid_heartbeats, presence.presence_changes):
+        state.clear()
+
+
+def test_fanout_uses_the_chat_room_and_skips_the_senders_sockets(monkeypatch):
+    monkeypatch.delenv("SOCKET_MESSAGE_QUEUE", raising=False)
+    register_sid("sid-1", "alice")
+    register_sid("sid-2", "alice")
+    register_sid("sid-3", "bob")
+    rooms, skip_sids = chat_fanout("chat", "alice", ["alice", "bob"])
+    assert rooms == "chat"
+    assert sorted(skip_sids) == ["sid-1", "sid-2"]
+
+
+def test_fanout_skips_nothing_for_a_sender_without_sockets(monkeypatch):
+    monkeypatch.delenv("SOCKET_MESSAGE_QUEUE", raising=False)
+    assert chat_fanout("chat", "alice", ["alice", "bob"]) == ("chat", [])
+
+
+def test_fanout_addresses_user_rooms_behind_a_message_queue(monkeypatch):
+    monkeypatch.setenv("SOCKET_MESSAGE_QUEUE", "redis://localhost:6379/0")
+    register_sid("sid-1", "alice")
+    # Sockets of other workers are invisible here, so offline users are kept.
+    rooms, skip_sids = chat_fanout("chat", "alice", ["alice", "bob", "carol"])
+    assert rooms == ["bob", "carol"]
+    assert skip_sids is None
+
+
+@pytest.mark.parametrize("data", ["chat", {"chatId": "chat"}])
+def test_join_chat_payload_accepts_a_chat_id(data):
+    assert JoinChatPayload.model_validate(data).chatId == "chat"
+
+
+@pytest.mark.parametrize("data", [None, "", 42, {"chatId": {"$ne": None}}, {"chat": "chat"}])
+def test_join_chat_payload_rejects_anything_else(data):
+    with pytest.raises(ValidationError):
+        JoinChatPayload.model_validate(data)
@@ -0,0 +1,95 @@
+import asyncio
+import time
+import orjson
+import pytest
+from bson import ObjectId
+from datetime import datetime
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+from models.responses import AllMessagesResponse
+from utils.serialization import dumps
+from utils.user_cache import hydrate_messages, user_profiles
+
+pytestmark = pytest.mark.benchmark
+
+MESSAGE_COUNT = 1000
+ROUNDS = 20
+
+
+def hydrated_messages() -> list[dict]:
+    chat_id = ObjectId()
+    senders = []
+    for index in range(5):
+        profile = {
+            "_id": ObjectId(),
+            "username": f"user{index}",
+            "email": f"user{index}@example.com",
+            "avatar": {"_id": ObjectId(), "url": "https://example.com/a.png", "localPath": ""},
+        }
+        user_profiles.set(profile["_id"], profile)
+        senders.append(profile["_id"])
+    now = datetime.now()
+    messages = [
+        {
+            "_id": ObjectId(),
+            "__v": 0,
+            "sender": senders[index % len(senders)],
+            "content": f"Message number {index} with a typical amount of text in it.",
+            "attachments": [],
+            "chat": chat_id,
+            "createdAt": now,
+            "updatedAt": now,
+        }
+        for index in range(MESSAGE_COUNT)
+    ]
+    # Every sender is cached, so hydration never reaches the database.
+    return asyncio.run(hydrate_messages(None, messages))
+
+
+async def best_of(fn) -> float:
+    timings = []
+    for _ in range(ROUNDS):
+        started = time.perf_counter()
+        await fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def test_fast_json_beats_response_model_serialization():
+    messages = hydrated_messages()
+    content = {
+        "statusCode": 200,
+        "data": messages,
+        "nextCursor": None,
+        "message": "Messages fetched successfully",
+        "success": True,
+    }
+    field = create_response_field(name="response", type_=AllMessagesResponse)
+
+    async def response_model_path():
+        # What a route annotated with -> AllMessagesResponse does by default.
+        model = AllMessagesResponse(**content)
+        body = await serialize_response(field=field, response_content=model)
+        return JSONResponse(body).body
+
+    async def fast_json_path():
+        return dumps(content)
+
+    async def run():
+        # Both bodies carry the same messages; the fast path only omits unset
+        # optional fields instead of writing them as null.
+        for path in (response_model_path, fast_json_path):
+            body = orjson.loads(await path())
+            assert [message["_id"] for message in body["data"]] == [
+                str(message["_id"]) for message in messages
+            ]
+        return await best_of(response_model_path), await best_of(fast_json_path)
+
+    response_model_seconds, fast_json_seconds = asyncio.run(run())
+    print(
+        f"\n{MESSAGE_COUNT} messages: response model {response_model_seconds * 1000:.2f} ms, "
+        f"serialization.dumps {fast_json_seconds * 1000:.2f} ms "
+        f"({response_model_seconds / fast_json_seconds:.1f}x)"
+    )
+    assert fast_json_seconds < response_model_seconds
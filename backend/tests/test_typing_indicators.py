@@ -0,0 +1,103 @@
+import asyncio
+import pytest
+from models.chat import ChatEventType
+from utils import typing_indicators
+from utils.typing_indicators import (
+    TYPING_ORIGIN,
+    expire_typers,
+    flush_typing,
+    forget_typing_sid,
+    mark_stopped_typing,
+    mark_typing,
+    typing_stats,
+)
+
+
+class RecordingIO:
+    def __init__(self):
+        self.emitted = []
+
+    async def emit(self, event, payload, room=None, skip_sid=None):
+        self.emitted.append((event, payload, room, skip_sid))
+
+
+@pytest.fixture(autouse=True)
+def clock(fake_time):
+    clock = fake_time(typing_indicators)
+    typing_indicators.typers.clear()
+    typing_indicators.dirty_chats.clear()
+    for counter in typing_indicators.typing_counters:
+        typing_indicators.typing_counters[counter] = 0
+    return clock
+
+
+def flush():
+    io = RecordingIO()
+    asyncio.run(flush_typing(io))
+    return io.emitted
+
+
+def test_repeated_typing_events_coalesce_into_one_snapshot():
+    for _ in range(5):
+        mark_typing("chat", "alice", "sid-a")
+    assert flush() == [
+        (ChatEventType.TYPING_USERS_EVENT, {"chatId": "chat", "users": ["alice"], "origin": TYPING_ORIGIN}, "chat", ["sid-a"])
+    ]
+    assert typing_stats() == {"received": 5, "suppressed": 4, "emitted": 1, "activeChats": 1}
+
+
+def test_unchanged_chats_are_not_flushed_again():
+    mark_typing("chat", "alice", "sid-a")
+    flush()
+    mark_typing("chat", "alice", "sid-a")
+    assert flush() == []
+
+
+def test_snapshot_lists_every_typer_without_skipping_sids():
+    mark_typing("chat", "alice", "sid-a")
+    mark_typing("chat", "bob", "sid-b")
+    [(_, payload, _, skip_sid)] = flush()
+    assert sorted(payload["users"]) == ["alice", "bob"]
+    assert skip_sid is None
+
+
+def test_stopped_typing_sends_an_empty_snapshot():
+    mark_typing("chat", "alice", "sid-a")
+    flush()
+    mark_stopped_typing("chat", "alice")
+    assert flush() == [
+        (ChatEventType.TYPING_USERS_EVENT, {"chatId": "chat", "users": [], "origin": TYPING_ORIGIN}, "chat", None)
+    ]
+    assert typing_indicators.typers == {}
+
+
+def test_stop_without_typing_is_suppressed():
+    mark_stopped_typing("chat", "alice")
+    assert flush() == []
+    assert typing_stats()["suppressed"] == 1
+
+
+def test_typers_expire(clock):
+    mark_typing("chat", "alice", "sid-a")
+    flush()
+    clock.now += typing_indicators.TYPING_EXPIRY_SECONDS - 1
+    mark_typing("chat", "alice", "sid-a")
+    clock.now += typing_indicators.TYPING_EXPIRY_SECONDS - 1
+    expire_typers()
+    assert "alice" in typing_indicators.typers["chat"]
+    clock.now += 1
+    assert flush() == [
+        (ChatEventType.TYPING_USERS_EVENT, {"chatId": "chat", "users": [], "origin": TYPING_ORIGIN}, "chat", None)
+    ]
+
+
+def test_disconnect_stops_typing_once_no_sockets_are_left():
+    mark_typing("chat", "alice", "sid-1")
+    mark_typing("chat", "alice", "sid-2")
+    flush()
+    forget_typing_sid("sid-1")
+    assert flush() == []
+    forget_typing_sid("sid-2")
+    assert flush() == [
+        (ChatEventType.TYPING_USERS_EVENT, {"chatId": "chat", "users": [], "origin": TYPING_ORIGIN}, "chat", None)
+    ]
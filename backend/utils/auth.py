@@ -3,12 +3,12 @@ from typing import Annotated
 from bson import ObjectId
 from fastapi import Depends, HTTPException, status, Request, Response, Cookie, Body
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from passlib.hash import hex_sha256
 from utils.dbUtils import get_client
-from pymongo import MongoClient
+from motor.motor_asyncio import AsyncIOMotorDatabase
 import os
 import secrets
+import time
 from models.auth import TokenData, UserResponse, UserRegister, UserInDB, UserLoginType
 from models.responses import (
     RegisterAndCurrentUserResponse,
@@ -19,7 +19,16 @@ from models.responses import (
     LoginResponse,
     BaseResponse,
 )
-from utils.mail import send_email, email_verification_content, forgot_password_content
+from utils.mail import enqueue_email, email_verification_content, forgot_password_content
+from utils.passwords import (
+    get_password_hash,
+    verify_password,
+    verify_and_update_password,
+)
+from utils.user_cache import invalidate_user_profile
+from utils.token_cache import decode_access_token
+from utils.socket_events import revoke_tokens_everywhere
+from socketio import AsyncServer
 
 ACCESS_TOKEN_SECRET = os.environ.get("ACCESS_TOKEN_SECRET")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.environ.get("ACCESS_TOKEN_EXPIRE_MINUTES"))
@@ -28,16 +37,11 @@ ALGORITHM = "HS256"
 REFRESH_TOKEN_EXPIRY = int(os.environ.get("REFRESH_TOKEN_EXPIRY"))
 
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-
 def verify_and_return_token(accessToken: Annotated[str | None, Cookie()] = None):
     if not accessToken:
         raise HTTPException(status_code=401, detail="Unauthorized request")
     try:
-        decoded_token = jwt.decode(
-            accessToken, ACCESS_TOKEN_SECRET, algorithms=[ALGORITHM]
-        )
+        decoded_token = decode_access_token(accessToken)
     except JWTError as error:
         raise HTTPException(
             status_code=401, detail=str(error) or "Invalid access token"
@@ -64,19 +68,11 @@ def verify_and_return_token(accessToken: Annotated[str | None, Cookie()] = None)
     #     )
 
 
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
-
-
-def get_password_hash(password):
-    return pwd_context.hash(password)
-
-
-def authenticate_user(db, username: str, password: str):
-    user = db.users.find_one({"username": username})
+async def authenticate_user(db: AsyncIOMotorDatabase, username: str, password: str):
+    user = await db.users.find_one({"username": username})
     if not user:
         return False
-    if not verify_password(password, user.password):
+    if not await verify_password(password, user["password"]):
         return False
     return user
 
@@ -87,12 +83,13 @@ def create_token(data: dict, key: str, expires_delta: timedelta | None = None) -
         expire = datetime.now(timezone.utc) + expires_delta
     else:
         expire = datetime.now(timezone.utc) + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
+    # Sub-second iat so tokens issued right after a revocation stay valid.
+    to_encode.update({"exp": expire, "iat": time.time()})
     encoded_jwt = jwt.encode(to_encode, key, algorithm=ALGORITHM)
     return encoded_jwt
 
 
-async def get_current_user(token: dict, db: MongoClient) -> dict:
+async def get_current_user(token: dict, db: AsyncIOMotorDatabase) -> dict:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -100,7 +97,7 @@ async def get_current_user(token: dict, db: MongoClient) -> dict:
     username: str = token.get("username")
     if username is None:
         raise credentials_exception
-    user = db.users.find_one({"username": username})
+    user = await db.users.find_one({"username": username})
     if user is None:
         raise credentials_exception
     return RegisterAndCurrentUserResponse(
@@ -132,16 +129,16 @@ async def generate_refresh_token(data: dict):
 
 
 async def register_user(
-    user_request: UserRegister, request: Request, db: MongoClient
+    user_request: UserRegister, request: Request, db: AsyncIOMotorDatabase
 ) -> UserResponse:
     users_collection = db.users
 
-    if users_collection.find_one(
+    if await users_collection.find_one(
         {"$or": [{"username": user_request.username}, {"email": user_request.email}]}
     ):
         raise HTTPException(status_code=409, detail="Username or email already exists")
 
-    hashed_password = get_password_hash(user_request.password)
+    hashed_password = await get_password_hash(user_request.password)
     unhashed_token, hashed_token, token_expiry = generate_temporary_token()
 
     user_data = user_request.model_dump()
@@ -165,11 +162,11 @@ async def register_user(
         }
     )
 
-    users_collection.insert_one(user_data)
+    await users_collection.insert_one(user_data)
 
     verify_email_url = f"{request.base_url}users/verify-email/{unhashed_token}"
     html_content = email_verification_content(user_request.username, verify_email_url)
-    await send_email(user_request.email, "Verify Your Email", html_content)
+    await enqueue_email(db, user_request.email, "Verify Your Email", html_content)
 
     # Remove sensitive data before returning the user object
     user_data.pop("emailVerificationToken", None)
@@ -189,19 +186,23 @@ async def register_user(
 async def login_user(
     login_request: UserRegister,
     response: Response,
-    db: MongoClient,
+    db: AsyncIOMotorDatabase,
 ) -> LoginResponse:
     if not login_request.username and not login_request.email:
         raise HTTPException(status_code=400, detail="Username or email is required")
 
-    user = db.users.find_one({"username": login_request.username})
+    user = await db.users.find_one({"username": login_request.username})
 
     if not user:
         raise HTTPException(status_code=404, detail="User does not exist")
 
-    is_password_valid = verify_password(login_request.password, user["password"])
+    is_password_valid, new_hash = await verify_and_update_password(
+        login_request.password, user["password"]
+    )
     if not is_password_valid:
         raise HTTPException(status_code=401, detail="Invalid user credentials")
+    if new_hash:
+        await db.users.update_one({"_id": user["_id"]}, {"$set": {"password": new_hash}})
 
     user_id = str(user.get("_id"))
     access_token = await generate_access_token(
@@ -228,7 +229,7 @@ async def login_user(
         key="refreshToken", value=refresh_token, httponly=True, samesite='none', secure=True
     )
     
-    db.users.update_one({"_id": ObjectId(user_id)}, {"$set": {"refreshToken": refresh_token}})
+    await db.users.update_one({"_id": ObjectId(user_id)}, {"$set": {"refreshToken": refresh_token}})
 
     user.pop("password", None)
     user.pop("refreshToken", None)
@@ -246,11 +247,11 @@ async def login_user(
 
 
 async def verify_email(
-    verification_token: str, db: MongoClient
+    verification_token: str, db: AsyncIOMotorDatabase
 ) -> EmailVerificationResponse:
     hashed_token = hex_sha256.hash(verification_token)
 
-    user = db.users.find_one(
+    user = await db.users.find_one(
         {
             "emailVerificationToken": hashed_token,
             "emailVerificationExpiry": {"$gt": datetime.now()},
@@ -259,7 +260,7 @@ async def verify_email(
     if not user:
         raise HTTPException(status_code=400, detail="Invalid verification token")
 
-    db.users.update_one(
+    await db.users.update_one(
         {"emailVerificationToken": hashed_token},
         {
             "$set": {
@@ -269,6 +270,7 @@ async def verify_email(
             }
         },
     )
+    invalidate_user_profile(user["_id"])
 
     return EmailVerificationResponse(
         message="Email verified successfully",
@@ -279,7 +281,7 @@ async def verify_email(
 
 
 async def refresh_access_token(
-    db: MongoClient,
+    db: AsyncIOMotorDatabase,
     response: Response,
     refresh_token: str | None = None,
 ):
@@ -297,7 +299,7 @@ async def refresh_access_token(
         if not user_id:
             raise HTTPException(status_code=401, detail="Invalid refresh token")
 
-        user = db.users.find_one({"_id": ObjectId(user_id)})
+        user = await db.users.find_one({"_id": ObjectId(user_id)})
         if not user:
             raise HTTPException(status_code=401, detail="Invalid refresh token")
 
@@ -323,7 +325,7 @@ async def refresh_access_token(
             }
         )
 
-        db.users.update_one(
+        await db.users.update_one(
             {"username": decoded_token["username"]}, {"$set": {"refreshToken": refresh_token}}
         )
         data = {"accessToken": access_token, "refreshToken": refresh_token}
@@ -353,14 +355,14 @@ async def refresh_access_token(
 
 
 async def forgot_password(
-    email: str, request: Request, db: MongoClient = Depends(get_client)
+    email: str, request: Request, db: AsyncIOMotorDatabase = Depends(get_client)
 ) -> BaseResponse:
-    user = db.users.find_one({"email": email})
+    user = await db.users.find_one({"email": email})
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     unHashedToken, hashedToken, tokenExpiry = generate_temporary_token()
 
-    db.users.update_one(
+    await db.users.update_one(
         {"email": email},
         {
             "$set": {
@@ -372,7 +374,7 @@ async def forgot_password(
     # need to change the url when the frontend is up
     forgotPasswordUrl = f"{request.base_url}users/reset-password/{unHashedToken}"
     htmlContent = forgot_password_content(user["username"], forgotPasswordUrl)
-    await send_email(user["email"], "Reset Your Password", htmlContent)
+    await enqueue_email(db, user["email"], "Reset Your Password", htmlContent)
     return BaseResponse(
         message="Forgot password email sent successfully",
         statusCode=200,
@@ -381,10 +383,13 @@ async def forgot_password(
 
 
 async def reset_password(
-    resetPasswordToken: str, newPassword: str, db: MongoClient = Depends(get_client)
+    resetPasswordToken: str,
+    newPassword: str,
+    sio: AsyncServer,
+    db: AsyncIOMotorDatabase = Depends(get_client),
 ):
     hashedToken = hex_sha256.hash(resetPasswordToken)
-    user = db.users.find_one(
+    user = await db.users.find_one(
         {
             "forgotPasswordToken": hashedToken,
             "forgotPasswordExpiry": {"$gt": datetime.now()},
@@ -393,9 +398,9 @@ async def reset_password(
     if not user:
         raise HTTPException(status_code=400, detail="Invalid reset password token")
 
-    hashedPassword = get_password_hash(newPassword)
+    hashedPassword = await get_password_hash(newPassword)
 
-    db.users.update_one(
+    await db.users.update_one(
         {"forgotPasswordToken": hashedToken},
         {
             "$set": {
@@ -405,6 +410,7 @@ async def reset_password(
             }
         },
     )
+    await revoke_tokens_everywhere(sio, user["_id"])
 
     return BaseResponse(
         message="Password reset successfully",
@@ -416,13 +422,15 @@ async def reset_password(
 async def logout_user(
     token: dict,
     response: Response,
-    db: MongoClient,
+    db: AsyncIOMotorDatabase,
+    sio: AsyncServer,
 ):
-    updated_user = db.users.update_one(
-        {"_id": token["_id"]}, {"$set": {"refreshToken": ""}}
+    updated_user = await db.users.update_one(
+        {"_id": ObjectId(token["_id"])}, {"$set": {"refreshToken": ""}}
     )
-    if not updated_user:
+    if not updated_user.matched_count:
         raise HTTPException(status_code=400, detail="User not found")
+    await revoke_tokens_everywhere(sio, token["_id"])
 
     cookie_options = {"httponly": True, "secure": True, "samesite": "Lax"}
     response.delete_cookie("accessToken", **cookie_options)
@@ -438,21 +446,23 @@ async def change_password(
     token: dict,
     old_password: str,
     new_password: str,
-    db: MongoClient = Depends(get_client),
+    sio: AsyncServer,
+    db: AsyncIOMotorDatabase = Depends(get_client),
 ):
-    user = db.users.find_one({"_id": ObjectId(token["_id"])})
+    user = await db.users.find_one({"_id": ObjectId(token["_id"])})
     if not user:
         raise HTTPException(status_code=400, detail="User not found")
 
-    is_password_valid = verify_password(old_password, user["password"])
+    is_password_valid = await verify_password(old_password, user["password"])
     if not is_password_valid:
         raise HTTPException(status_code=401, detail="Invalid user credentials")
 
-    hashedPassword = get_password_hash(new_password)
+    hashedPassword = await get_password_hash(new_password)
 
-    db.users.update_one(
+    await db.users.update_one(
         {"_id": ObjectId(token["_id"])}, {"$set": {"password": hashedPassword}}
     )
+    await revoke_tokens_everywhere(sio, token["_id"])
 
     return BaseResponse(
         message="Password changed successfully",
@@ -464,15 +474,15 @@ async def change_password(
 async def resend_email_verification(
     token: dict,
     request: Request,
-    db: MongoClient,
+    db: AsyncIOMotorDatabase,
 ):
-    user = db.users.find_one({"_id": ObjectId(token["_id"])})
+    user = await db.users.find_one({"_id": ObjectId(token["_id"])})
     if not user:
         raise HTTPException(status_code=400, detail="User not found")
 
     unhashedToken, hashedToken, tokenExpiry = generate_temporary_token()
 
-    db.users.update_one(
+    await db.users.update_one(
         {"_id": ObjectId(token["_id"])},
         {
             "$set": {
@@ -484,7 +494,7 @@ async def resend_email_verification(
 
     verifyEmailUrl = f"{request.base_url}users/verify-email/{unhashedToken}"
     htmlContent = email_verification_content(user["username"], verifyEmailUrl)
-    await send_email(user["email"], "Verify Your Email", htmlContent)
+    await enqueue_email(db, user["email"], "Verify Your Email", htmlContent)
 
     return BaseResponse(
         message="Verification email sent successfully",
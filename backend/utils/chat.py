@@ -1,6 +1,8 @@
 from fastapi import Request, Response, Depends, HTTPException, UploadFile
 from typing import Annotated
-from pymongo import MongoClient
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 from models.responses import (
     AllChatResponse,
     AvailableUsersResponse,
@@ -11,175 +13,175 @@ from models.responses import (
     ChatWithoutLastMessageResponse,
     AllMessagesResponse,
     SendMessageResponse,
+    ReadReceiptResponse,
+    PresenceResponse,
+    ChatChangesResponse,
 )
 from utils.dbUtils import get_client
 from bson import ObjectId
-from utils.socket_events import emit_socket_event
+from utils.socket_events import (
+    emit_socket_event,
+    emit_logged_socket_event,
+    dispatch_socket_event,
+)
+from utils.delivery import record_delivery
 from datetime import datetime
-from models.chat import Chat
+from models.chat import ChatListItem, Message
 from models.auth import PyObjectId
 from socketio import AsyncServer
 from models.chat import ChatEventType
-import os
+import asyncio
+import re
 import uuid
 import shutil
-from utils.file_handling import upload_file
-
-
-def common_chat_aggregation():
-    return [
-        {
-            "$lookup": {
-                "from": "users",
-                "foreignField": "_id",
-                "localField": "participants",
-                "as": "participants",
-                "pipeline": [
-                    {
-                        "$project": {
-                            "password": 0,
-                            "refreshToken": 0,
-                            "forgotPasswordToken": 0,
-                            "forgotPasswordTokenExpiry": 0,
-                            "emailVerificationToken": 0,
-                            "emailVerificationTokenExpiry": 0,
-                        }
-                    }
-                ],
-            }
-        },
-        {
-            "$lookup": {
-                "from": "chatmessages",
-                "foreignField": "_id",
-                "localField": "lastMessage",
-                "as": "lastMessage",
-                "pipeline": [
-                    {
-                        "$lookup": {
-                            "from": "users",
-                            "foreignField": "_id",
-                            "localField": "sender",
-                            "as": "sender",
-                            "pipeline": [
-                                {
-                                    "$project": {
-                                        "username": 1,
-                                        "avatar": 1,
-                                        "email": 1,
-                                    }
-                                }
-                            ],
-                        }
-                    },
-                    {"$addFields": {"sender": {"$first": "$sender"}}},
-                ],
-            }
-        },
-        {
-            "$addFields": {
-                "lastMessage": {"$first": "$lastMessage"},
-            }
-        },
-    ]
+from utils.file_handling import upload_files, release_attachment_references
+from utils.deletion import schedule_chat_deletion
+from utils.image_variants import apply_known_variants, schedule_message_variants
+from utils.inbox import (
+    get_user_inbox,
+    sync_chat_inbox,
+    update_chat_inbox,
+    update_inbox_last_message,
+    mark_inbox_read,
+    remove_chat_inbox,
+    current_inbox_version,
+    get_user_inbox_changes,
+    stored_before,
+)
+from utils.serialization import fast_response
+from utils.presence import get_presence
+from utils.membership import add_chat_members, remove_chat_members, chat_fanout
+from utils.user_cache import (
+    get_user_profile,
+    get_user_profiles,
+    user_summary,
+    hydrate_chat,
+    hydrate_messages,
+)
 
 
-def common_message_aggregation():
-    return [
-        {
-            "$lookup": {
-                "from": "users",
-                "foreignField": "_id",
-                "localField": "sender",
-                "as": "sender",
-                "pipeline": [
-                    {
-                        "$project": {
-                            "username": 1,
-                            "avatar": 1,
-                            "email": 1,
-                        }
-                    }
-                ],
-            }
-        },
-        {"$addFields": {"sender": {"$first": "$sender"}}},
-    ]
+def chat_list_payload(chat: dict) -> dict:
+    """Socket payload for a hydrated chat in the chat list shape, with participant summaries."""
+    return ChatListItem(**chat).model_dump(mode="json", by_alias=True)
 
 
 async def get_all_messages(
     token: dict,
-    db: MongoClient,
+    db: AsyncIOMotorDatabase,
 ):
-    pipeline = [
-        {"$match": {"participants": {"$elemMatch": {"$eq": ObjectId(token["_id"])}}}},
-        {"$sort": {"updatedAt": -1}},
-        *common_chat_aggregation(),
-    ]
-    chats = db.chats.aggregate(pipeline)
-    chats = list(chats)
-    return AllChatResponse(
+    # Taken before the list so clients can continue with changes since this version.
+    version = current_inbox_version()
+    chats = await get_user_inbox(db, ObjectId(token["_id"]))
+    return fast_response(
+        AllChatResponse,
         success=True,
         statusCode=200,
         message="All messages fetched successfully",
         data=chats,
+        version=version,
     )
 
 
-async def search_available_users(token: dict, db: MongoClient):
-    pipeline = [
-        {"$match": {"_id": {"$ne": ObjectId(token["_id"])}}},
+async def get_chat_changes(
+    token: dict,
+    since: int,
+    db: AsyncIOMotorDatabase,
+):
+    changes = await get_user_inbox_changes(db, ObjectId(token["_id"]), since)
+    return fast_response(
+        ChatChangesResponse,
+        success=True,
+        statusCode=200,
+        message="Chat changes fetched successfully",
+        data=changes,
+    )
+
+
+async def search_available_users(
+    token: dict,
+    db: AsyncIOMotorDatabase,
+    query: str | None = None,
+    cursor: str | None = None,
+    limit: int = 20,
+):
+    match = {"_id": {"$ne": ObjectId(token["_id"])}}
+    if query:
+        # Usernames and emails are stored lowercased, so an anchored case-sensitive
+        # regex on the lowercased query is both case-insensitive and index-backed.
+        prefix = f"^{re.escape(query.strip().lower())}"
+        match["$or"] = [
+            {"username": {"$regex": prefix}},
+            {"email": {"$regex": prefix}},
+        ]
+    if cursor:
+        match["username"] = {"$gt": cursor}
+
+    users = await db.users.find(
+        match,
         {
-            "$project": {
-                "avatar": 1,
-                "username": 1,
-                "email": 1,
-            }
+            "avatar": 1,
+            "username": 1,
+            "email": 1,
         },
-    ]
-    users = list(db.users.aggregate(pipeline))
+    ).sort("username", 1).limit(limit + 1).to_list(None)
+
+    next_cursor = None
+    if len(users) > limit:
+        users = users[:limit]
+        next_cursor = users[-1]["username"]
+
     return AvailableUsersResponse(
         success=True,
         statusCode=200,
         message="Available users fetched successfully",
         data=users,
+        nextCursor=next_cursor,
+    )
+
+
+async def get_users_presence(
+    token: dict,
+    user_ids: list[str],
+    db: AsyncIOMotorDatabase,
+):
+    if not all(ObjectId.is_valid(user_id) for user_id in user_ids):
+        raise HTTPException(status_code=400, detail="Invalid user id")
+    presence = await get_presence(
+        db, ObjectId(token["_id"]), [ObjectId(user_id) for user_id in user_ids]
+    )
+    return PresenceResponse(
+        statusCode=200,
+        data=presence,
+        message="Presence fetched successfully",
+        success=True,
     )
 
 
 async def create_or_get_one_on_one_chat(
-    token: dict, receiver_id: str, db: MongoClient, sio: AsyncServer
+    token: dict, receiver_id: str, db: AsyncIOMotorDatabase, sio: AsyncServer
 ):
     user_id = token["_id"]
-    receiver = db.users.find_one({"_id": ObjectId(receiver_id)})
+    receiver = await get_user_profile(db, ObjectId(receiver_id))
     if not receiver:
         raise HTTPException(status_code=404, detail="Receiver does not exist")
 
     if receiver_id == user_id:
         raise HTTPException(status_code=400, detail="You cannot chat with yourself")
 
-    chat_aggregation = common_chat_aggregation()
-    chat = db.chats.aggregate(
-        [
-            {
-                "$match": {
-                    "isGroupChat": False,
-                    "participants": {
-                        "$all": [ObjectId(user_id), ObjectId(receiver_id)]
-                    },
-                }
-            },
-            *chat_aggregation,
-        ]
+    chat = await db.chats.find_one(
+        {
+            "isGroupChat": False,
+            "participants": {"$all": [ObjectId(user_id), ObjectId(receiver_id)]},
+        }
     )
 
-    chat = list(chat)
     if chat:
-        data = chat[0]
+        data = await hydrate_chat(db, chat)
         return ChatResponse(
             statusCode=200, data=data, message="Chat already exists", success=True
         )
 
-    new_chat_instance = db.chats.insert_one(
+    new_chat_instance = await db.chats.insert_one(
         {
             "name": "One on one chat",
             "participants": [ObjectId(user_id), ObjectId(receiver_id)],
@@ -191,24 +193,26 @@ async def create_or_get_one_on_one_chat(
         }
     )
 
-    created_chat = db.chats.aggregate(
-        [{"$match": {"_id": new_chat_instance.inserted_id}}, *chat_aggregation]
+    await sync_chat_inbox(db, new_chat_instance.inserted_id)
+    await add_chat_members(
+        sio, str(new_chat_instance.inserted_id), [user_id, receiver_id]
     )
-
-    created_chat = list(created_chat)
+    created_chat = await db.chats.find_one({"_id": new_chat_instance.inserted_id})
     if not created_chat:
         raise HTTPException(status_code=500, detail="Internal server error")
 
-    payload = created_chat[0]
-    await emit_socket_event(sio, payload["_id"], ChatEventType.NEW_CHAT_EVENT, payload)
+    chat = await hydrate_chat(db, created_chat)
+    await emit_logged_socket_event(
+        sio, db, [receiver_id], ChatEventType.NEW_CHAT_EVENT, chat_list_payload(chat)
+    )
 
     return ChatResponse(
-        statusCode=201, data=payload, message="Chat created successfully", success=True
+        statusCode=201, data=chat, message="Chat created successfully", success=True
     )
 
 
 async def create_group_chat(
-    token: dict, req: CreateGroupChatRequest, db: MongoClient, sio: AsyncServer
+    token: dict, req: CreateGroupChatRequest, db: AsyncIOMotorDatabase, sio: AsyncServer
 ):
     user_id = token["_id"]
     participants = req.participants
@@ -224,14 +228,13 @@ async def create_group_chat(
             status_code=400, detail="You need to add atleast 2 participants"
         )
 
-    users = db.users.find({"_id": {"$in": participants}})
-    users = list(users)
+    users = await get_user_profiles(db, participants)
     if len(users) != len(participants):
         raise HTTPException(
             status_code=404, detail="One or more participants do not exist"
         )
 
-    chat = db.chats.insert_one(
+    chat = await db.chats.insert_one(
         {
             "name": req.name,
             "participants": participants,
@@ -243,40 +246,31 @@ async def create_group_chat(
         }
     )
 
-    chat = db.chats.aggregate(
-        [{"$match": {"_id": chat.inserted_id}}, *common_chat_aggregation()]
-    )
-
-    chat = list(chat)
+    await sync_chat_inbox(db, chat.inserted_id)
+    await add_chat_members(sio, str(chat.inserted_id), [str(p) for p in participants])
+    chat = await db.chats.find_one({"_id": chat.inserted_id})
     if not chat:
         raise HTTPException(status_code=500, detail="Internal server error")
-
-    for participant in participants:
-        if str(participant) == user_id:
-            continue
-        else:
-            await emit_socket_event(
-                sio, str(participant), ChatEventType.NEW_CHAT_EVENT, chat[0]
-            )
+    chat = await hydrate_chat(db, chat)
+
+    await emit_logged_socket_event(
+        sio,
+        db,
+        [str(p) for p in participants if str(p) != user_id],
+        ChatEventType.NEW_CHAT_EVENT,
+        chat_list_payload(chat),
+    )
 
     return ChatResponse(
-        statusCode=201, data=chat[0], message="Chat created successfully", success=True
+        statusCode=201, data=chat, message="Chat created successfully", success=True
     )
 
 
 async def remove_one_on_one_chat(
-    token: dict, chat_id: str, db: MongoClient, sio: AsyncServer
+    token: dict, chat_id: str, db: AsyncIOMotorDatabase, sio: AsyncServer
 ):
     user_id = token["_id"]
-    pipeline = [
-        {
-            "$match": {
-                "_id": ObjectId(chat_id),
-            },
-        },
-        *common_chat_aggregation(),
-    ]
-    chat = list(db.chats.aggregate(pipeline))[0]
+    chat = await db.chats.find_one({"_id": ObjectId(chat_id)})
     if not chat:
         raise HTTPException(status_code=404, detail="Chat does not exist")
 
@@ -285,7 +279,7 @@ async def remove_one_on_one_chat(
             status_code=400, detail="You cannot delete a group chat this way"
         )
 
-    if ObjectId(user_id) not in list(x["_id"] for x in chat["participants"]):
+    if ObjectId(user_id) not in chat["participants"]:
         raise HTTPException(
             status_code=400, detail="You are not a participant of this chat"
         )
@@ -296,46 +290,34 @@ async def remove_one_on_one_chat(
             detail="You cannot delete a group chat this way. Please leave the group instead",
         )
 
-    db.chats.delete_one({"_id": ObjectId(chat_id)})
-    await delete_cascade_chat_meessages(chat_id, db)
+    # Tombstone first: if the process dies after the chat is gone, the job still
+    # removes its messages and attachments.
+    await schedule_chat_deletion(db, ObjectId(chat_id))
+    await db.chats.delete_one({"_id": ObjectId(chat_id)})
+    await remove_chat_inbox(db, ObjectId(chat_id))
+    await remove_chat_members(
+        sio, chat_id, [str(p) for p in chat["participants"]]
+    )
 
-    for participant in chat["participants"]:
-        if str(participant) == user_id:
-            continue
-        else:
-            other_user = str(participant)
-    await emit_socket_event(sio, participant, ChatEventType.LEAVE_CHAT_EVENT, chat)
+    await emit_logged_socket_event(
+        sio,
+        db,
+        [str(p) for p in chat["participants"] if str(p) != user_id],
+        ChatEventType.LEAVE_CHAT_EVENT,
+        {"_id": chat_id},
+    )
     return BaseResponse(
         statusCode=204, message="Chat deleted successfully", success=True
     )
 
 
-async def delete_cascade_chat_meessages(chatID: str, db: MongoClient):
-    messages = db.chatmessages.find({"chat": ObjectId(chatID)})
-    attachments = []
-    for message in messages:
-        attachments.extend(message["attachments"])
-    for attachment in attachments:
-        os.remove(attachment["localPath"])
-    db.chatmessages.delete_many({"chat": ObjectId(chatID)})
-
-
 async def get_group_chat_details(
     token: dict,
     chat_id: str,
-    db: MongoClient,
+    db: AsyncIOMotorDatabase,
 ):
     user_id = token["_id"]
-    pipeline = [
-        {
-            "$match": {
-                "_id": ObjectId(chat_id),
-                "isGroupChat": True,
-            },
-        },
-        *common_chat_aggregation(),
-    ]
-    chat = db.chats.aggregate(pipeline)[0]
+    chat = await db.chats.find_one({"_id": ObjectId(chat_id), "isGroupChat": True})
     if not chat:
         raise HTTPException(status_code=404, detail="Group Chat does not exist")
 
@@ -352,7 +334,7 @@ async def get_group_chat_details(
 
     return ChatResponse(
         statusCode=200,
-        data=chat,
+        data=await hydrate_chat(db, chat),
         message="Chat details fetched successfully",
         success=True,
     )
@@ -361,20 +343,11 @@ async def get_group_chat_details(
 async def delete_group_chat(
     token: dict,
     chat_id: str,
-    db: MongoClient,
+    db: AsyncIOMotorDatabase,
     sio: AsyncServer,
 ):
     user_id = token["_id"]
-    pipeline = [
-        {
-            "$match": {
-                "_id": ObjectId(chat_id),
-                "isGroupChat": True,
-            },
-        },
-        *common_chat_aggregation(),
-    ]
-    chat = list(db.chats.aggregate(pipeline))[0]
+    chat = await db.chats.find_one({"_id": ObjectId(chat_id), "isGroupChat": True})
     if not chat:
         raise HTTPException(status_code=404, detail="Group Chat does not exist")
 
@@ -388,15 +361,22 @@ async def delete_group_chat(
             status_code=400, detail="You are not the admin of this chat"
         )
 
-    db.chats.delete_one({"_id": ObjectId(chat_id)})
-    await delete_cascade_chat_meessages(chat_id, db)
-    for participant in chat["participants"]:
-        if str(participant) == user_id:
-            continue
-        else:
-            emit_socket_event(
-                sio, str(participant), ChatEventType.LEAVE_CHAT_EVENT, chat
-            )
+    # Tombstone first: if the process dies after the chat is gone, the job still
+    # removes its messages and attachments.
+    await schedule_chat_deletion(db, ObjectId(chat_id))
+    await db.chats.delete_one({"_id": ObjectId(chat_id)})
+    await remove_chat_inbox(db, ObjectId(chat_id))
+    await remove_chat_members(
+        sio, chat_id, [str(p) for p in chat["participants"]]
+    )
+
+    await emit_logged_socket_event(
+        sio,
+        db,
+        [str(p) for p in chat["participants"] if str(p) != user_id],
+        ChatEventType.LEAVE_CHAT_EVENT,
+        {"_id": chat_id},
+    )
 
     return BaseResponse(
         statusCode=204, message="Chat deleted successfully", success=True
@@ -404,19 +384,10 @@ async def delete_group_chat(
 
 
 async def update_group_name(
-    token: dict, chat_id: str, name: str, db: MongoClient, sio: AsyncServer
+    token: dict, chat_id: str, name: str, db: AsyncIOMotorDatabase, sio: AsyncServer
 ):
     user_id = token["_id"]
-    pipeline = [
-        {
-            "$match": {
-                "_id": ObjectId(chat_id),
-                "isGroupChat": True,
-            },
-        },
-        *common_chat_aggregation(),
-    ]
-    chat = list(db.chats.aggregate(pipeline))[0]
+    chat = await db.chats.find_one({"_id": ObjectId(chat_id), "isGroupChat": True})
     if not chat:
         raise HTTPException(status_code=404, detail="Group Chat does not exist")
 
@@ -430,36 +401,29 @@ async def update_group_name(
             status_code=400, detail="You are not the admin of this chat"
         )
 
-    db.chats.update_one({"_id": ObjectId(chat_id)}, {"$set": {"name": name}})
-    chat = list(db.chats.aggregate(pipeline))[0]
-    if not chat:
-        raise HTTPException(status_code=500, detail="Internal server error")
-    for participant in chat["participants"]:
-        await emit_socket_event(
-            sio, str(participant), ChatEventType.UPDATE_GROUP_NAME_EVENT, chat
-        )
+    await db.chats.update_one({"_id": ObjectId(chat_id)}, {"$set": {"name": name}})
+    await update_chat_inbox(db, ObjectId(chat_id), {"name": name})
+    # Clients already hold the chat; only the changed field is sent.
+    await emit_socket_event(
+        sio,
+        [str(p) for p in chat["participants"]],
+        ChatEventType.UPDATE_GROUP_NAME_EVENT,
+        {"_id": chat_id, "name": name},
+    )
+    chat["name"] = name
     return ChatWithoutLastMessageResponse(
         statusCode=200,
-        data=chat,
+        data=await hydrate_chat(db, chat),
         message="Chat name updated successfully",
         success=True,
     )
 
 
 async def add_participant_to_group(
-    token: dict, chat_id: str, participant_id: str, db: MongoClient, sio: AsyncServer
+    token: dict, chat_id: str, participant_id: str, db: AsyncIOMotorDatabase, sio: AsyncServer
 ):
     user_id = token["_id"]
-    pipeline = [
-        {
-            "$match": {
-                "_id": ObjectId(chat_id),
-                "isGroupChat": True,
-            },
-        },
-        *common_chat_aggregation(),
-    ]
-    chat = list(db.chats.aggregate(pipeline))[0]
+    chat = await db.chats.find_one({"_id": ObjectId(chat_id), "isGroupChat": True})
     if not chat:
         raise HTTPException(status_code=404, detail="Group Chat does not exist")
 
@@ -473,31 +437,31 @@ async def add_participant_to_group(
             status_code=400, detail="You are not the admin of this chat"
         )
 
-    user = db.users.find_one({"_id": ObjectId(participant_id)})
+    user = await get_user_profile(db, ObjectId(participant_id))
     if not user:
         raise HTTPException(status_code=404, detail="User does not exist")
 
     if ObjectId(participant_id) in chat["participants"]:
         raise HTTPException(
-            status_code=400, detail="User is already a participant of this chat"
+            status_code=409, detail="User is already a participant of this chat"
         )
 
-    old_participants = chat["participants"]
-    for participant in old_participants:
-        if str(participant) == participant_id:
-            raise HTTPException(
-                status_code=409, detail="User is already a participant of this chat"
-            )
-
-    db.chats.update_one(
+    chat = await db.chats.find_one_and_update(
         {"_id": ObjectId(chat_id)},
-        {"$push": {"participants": ObjectId(participant_id)}},
+        {"$addToSet": {"participants": ObjectId(participant_id)}},
+        return_document=ReturnDocument.AFTER,
     )
-    chat = list(db.chats.aggregate(pipeline))[0]
     if not chat:
         raise HTTPException(status_code=500, detail="Internal server error")
-    await emit_socket_event(
-        sio, str(participant_id), ChatEventType.NEW_CHAT_EVENT, chat
+    await sync_chat_inbox(db, ObjectId(chat_id))
+    chat = await hydrate_chat(db, chat)
+    await add_chat_members(sio, chat_id, [participant_id])
+    await emit_logged_socket_event(
+        sio,
+        db,
+        [str(participant_id)],
+        ChatEventType.NEW_CHAT_EVENT,
+        chat_list_payload(chat),
     )
     return ChatWithoutLastMessageResponse(
         statusCode=200,
@@ -508,19 +472,10 @@ async def add_participant_to_group(
 
 
 async def remove_participant_from_group(
-    token: dict, chat_id: str, participant_id: str, db: MongoClient, sio: AsyncServer
+    token: dict, chat_id: str, participant_id: str, db: AsyncIOMotorDatabase, sio: AsyncServer
 ) -> ChatWithoutLastMessageResponse:
     user_id = token["_id"]
-    pipeline = [
-        {
-            "$match": {
-                "_id": ObjectId(chat_id),
-                "isGroupChat": True,
-            },
-        },
-        *common_chat_aggregation(),
-    ]
-    chat = list(db.chats.aggregate(pipeline))[0]
+    chat = await db.chats.find_one({"_id": ObjectId(chat_id), "isGroupChat": True})
     if not chat:
         raise HTTPException(status_code=404, detail="Group Chat does not exist")
 
@@ -534,44 +489,40 @@ async def remove_participant_from_group(
             status_code=400, detail="You are not the admin of this chat"
         )
 
-    user = db.users.find_one({"_id": ObjectId(participant_id)})
+    user = await get_user_profile(db, ObjectId(participant_id))
     if not user:
         raise HTTPException(status_code=404, detail="User does not exist")
 
-    if ObjectId(participant_id) not in list(x["_id"] for x in chat["participants"]):
+    if ObjectId(participant_id) not in chat["participants"]:
         raise HTTPException(
             status_code=400, detail="User is not a participant of this chat"
         )
 
-    db.chats.update_one(
+    chat = await db.chats.find_one_and_update(
         {"_id": ObjectId(chat_id)},
         {"$pull": {"participants": ObjectId(participant_id)}},
+        return_document=ReturnDocument.AFTER,
     )
-    chat = list(db.chats.aggregate(pipeline))[0]
     if not chat:
         raise HTTPException(status_code=500, detail="Internal server error")
-    await emit_socket_event(
-        sio, str(participant_id), ChatEventType.LEAVE_CHAT_EVENT, chat
+    await sync_chat_inbox(db, ObjectId(chat_id))
+    await remove_chat_members(sio, chat_id, [participant_id])
+    await emit_logged_socket_event(
+        sio, db, [str(participant_id)], ChatEventType.LEAVE_CHAT_EVENT, {"_id": chat_id}
     )
     return ChatWithoutLastMessageResponse(
-        statusCode=200, data=chat, message="User removed successfully", success=True
+        statusCode=200,
+        data=await hydrate_chat(db, chat),
+        message="User removed successfully",
+        success=True,
     )
 
 
 async def leave_group_chat(
-    token: dict, chat_id: str, db: MongoClient, sio: AsyncServer
+    token: dict, chat_id: str, db: AsyncIOMotorDatabase, sio: AsyncServer
 ):
     user_id = token["_id"]
-    pipeline = [
-        {
-            "$match": {
-                "_id": ObjectId(chat_id),
-                "isGroupChat": True,
-            },
-        },
-        *common_chat_aggregation(),
-    ]
-    chat = db.chats.aggregate(pipeline)[0]
+    chat = await db.chats.find_one({"_id": ObjectId(chat_id), "isGroupChat": True})
     if not chat:
         raise HTTPException(status_code=404, detail="Group Chat does not exist")
 
@@ -590,50 +541,83 @@ async def leave_group_chat(
             status_code=400, detail="You are not a participant of this chat"
         )
 
-    db.chats.update_one(
-        {"_id": ObjectId(chat_id)}, {"$pull": {"participants": ObjectId(user_id)}}
+    chat = await db.chats.find_one_and_update(
+        {"_id": ObjectId(chat_id)},
+        {"$pull": {"participants": ObjectId(user_id)}},
+        return_document=ReturnDocument.AFTER,
     )
-    chat = db.chats.aggregate(pipeline)[0]
     if not chat:
         raise HTTPException(status_code=500, detail="Internal server error")
+    await sync_chat_inbox(db, ObjectId(chat_id))
+    await remove_chat_members(sio, chat_id, [user_id])
     return ChatResponse(
-        statusCode=200, data=chat, message="User removed successfully", success=True
+        statusCode=200,
+        data=await hydrate_chat(db, chat),
+        message="User removed successfully",
+        success=True,
     )
 
 
 async def get_all_messages_for_chat(
     token: dict,
     chat_id: str,
-    db: MongoClient,
+    db: AsyncIOMotorDatabase,
+    before: str | None = None,
+    after: str | None = None,
+    limit: int = 50,
 ):
     user_id = token["_id"]
-    chat = db.chats.find_one({"_id": ObjectId(chat_id)})
+    chat = await db.chats.find_one({"_id": ObjectId(chat_id)})
     if not chat:
         raise HTTPException(status_code=404, detail="Chat does not exist")
     if ObjectId(user_id) not in chat["participants"]:
         raise HTTPException(
             status_code=400, detail="User is not a participant of this chat"
         )
+    if before and after:
+        raise HTTPException(
+            status_code=400, detail="Only one of before or after can be provided"
+        )
 
-    messages = db.chatmessages.aggregate(
-        [
-            {
-                "$match": {
-                    "chat": ObjectId(chat_id),
-                },
-            },
-            *common_message_aggregation(),
+    match = {"chat": ObjectId(chat_id)}
+    # Newest first by default; "after" walks forward in time and is reversed below.
+    direction = 1 if after else -1
+    cursor_id = before or after
+    if cursor_id:
+        if not ObjectId.is_valid(cursor_id):
+            raise HTTPException(status_code=400, detail="Invalid message cursor")
+        cursor_message = await db.chatmessages.find_one(
+            {"_id": ObjectId(cursor_id), "chat": ObjectId(chat_id)},
+            {"createdAt": 1},
+        )
+        if not cursor_message:
+            raise HTTPException(status_code=400, detail="Invalid message cursor")
+        operator = "$gt" if after else "$lt"
+        match["$or"] = [
+            {"createdAt": {operator: cursor_message["createdAt"]}},
             {
-                "$sort": {
-                    "createdAt": -1,
-                }
+                "createdAt": cursor_message["createdAt"],
+                "_id": {operator: cursor_message["_id"]},
             },
         ]
-    )
-    messages = list(messages)
-    return AllMessagesResponse(
+
+    messages = await db.chatmessages.find(match).sort(
+        [("createdAt", direction), ("_id", direction)]
+    ).limit(limit + 1).to_list(None)
+
+    next_cursor = None
+    if len(messages) > limit:
+        messages = messages[:limit]
+        next_cursor = str(messages[-1]["_id"])
+    if after:
+        messages.reverse()
+    await hydrate_messages(db, messages)
+
+    return fast_response(
+        AllMessagesResponse,
         statusCode=200,
         data=messages,
+        nextCursor=next_cursor,
         message="Messages fetched successfully",
         success=True,
     )
@@ -644,31 +628,56 @@ async def send_message_to_chat(
     chat_id: str,
     content: str,
     attachments: list[UploadFile] | None,
-    db: MongoClient,
+    db: AsyncIOMotorDatabase,
     sio: AsyncServer,
-    request: Request,
+    request: Request | None,
+    client_message_id: str | None = None,
 ):
+    """Persist a message and fan it out. Shared by the HTTP route and the socket event."""
     user_id = token["_id"]
+    attachments = attachments or []
     if not content and not attachments:
         raise HTTPException(
             status_code=400, detail="Message content or attachment is required"
         )
 
-    chat = db.chats.find_one({"_id": ObjectId(chat_id)})
+    chat, sender = await asyncio.gather(
+        db.chats.find_one({"_id": ObjectId(chat_id)}, {"participants": 1}),
+        get_user_profile(db, ObjectId(user_id)),
+    )
     if not chat:
         raise HTTPException(status_code=404, detail="Chat does not exist")
+    if ObjectId(user_id) not in chat["participants"] or not sender:
+        raise HTTPException(
+            status_code=400, detail="User is not a participant of this chat"
+        )
+    sender = user_summary(sender)
 
-    message_files = []
-    for file in attachments:
-        upload_file_response = await upload_file(file, request)
-        message_files.append(
-            {
-                "name": file.filename,
-                "url": upload_file_response["url"],
-                "localPath": upload_file_response["localPath"],
-            }
+    if client_message_id:
+        # Retries of an already persisted message return the original untouched.
+        existing = await db.chatmessages.find_one(
+            {"sender": ObjectId(user_id), "clientMessageId": client_message_id}
         )
+        if existing:
+            return SendMessageResponse(
+                statusCode=200,
+                data=Message(**{**existing, "sender": sender}),
+                message="Message already sent",
+                success=True,
+            )
 
+    uploads = await upload_files(attachments, request, db)
+    message_files = [
+        {
+            "_id": ObjectId(),
+            "name": file.filename,
+            "url": upload["url"],
+            "localPath": upload["localPath"],
+            "hash": upload["hash"],
+            "size": upload["size"],
+        }
+        for file, upload in zip(attachments, uploads)
+    ]
     message_data = {
         "__v": 0,
         "sender": ObjectId(user_id),
@@ -678,33 +687,131 @@ async def send_message_to_chat(
         "createdAt": datetime.now(),
         "updatedAt": datetime.now(),
     }
-
-    new_message = db.chatmessages.insert_one(message_data)
+    if client_message_id:
+        message_data["clientMessageId"] = client_message_id
+
+    # Each upload holds a reference from here on; give them back unless the
+    # message that uses them is actually stored.
+    try:
+        pending_variants = (
+            await apply_known_variants(db, message_files, str(request.base_url))
+            if message_files
+            else []
+        )
+        new_message = await db.chatmessages.insert_one(message_data)
+    except DuplicateKeyError:
+        # A concurrent retry won; this copy's uploads are not referenced by it.
+        await release_attachment_references(db, message_files)
+        existing = await db.chatmessages.find_one(
+            {"sender": ObjectId(user_id), "clientMessageId": client_message_id}
+        )
+        return SendMessageResponse(
+            statusCode=200,
+            data=Message(**{**existing, "sender": sender}),
+            message="Message already sent",
+            success=True,
+        )
+    except BaseException:
+        await release_attachment_references(db, message_files)
+        raise
     message_data["_id"] = new_message.inserted_id
 
-    db.chats.update_one(
-        {"_id": ObjectId(chat_id)}, {"$set": {"lastMessage": new_message.inserted_id}}
+    # Only replaces an older last message; concurrent sends can land out of order.
+    await db.chats.update_one(
+        {
+            "_id": ObjectId(chat_id),
+            **stored_before(message_data, "lastMessageAt", "lastMessage"),
+        },
+        {
+            "$set": {
+                "lastMessage": new_message.inserted_id,
+                "lastMessageAt": message_data["createdAt"],
+                "updatedAt": message_data["createdAt"],
+            }
+        },
     )
 
-    for participant in chat.get("participants", []):
-        if str(participant) != user_id:
-            await emit_socket_event(
-                sio, participant, ChatEventType.MESSAGE_RECEIVED_EVENT, message_data
-            )
-    message_data = db.chatmessages.aggregate(
-        [
-            {
-                "$match": {
-                    "_id": new_message.inserted_id,
-                },
-            },
-            *common_message_aggregation(),
-        ]
+    if pending_variants:
+        schedule_message_variants(
+            db, new_message.inserted_id, pending_variants, str(request.base_url)
+        )
+
+    message = Message(**{**message_data, "sender": sender})
+    # Serialized once and handed to a background task so the response does not
+    # wait on fan-out, however large the group is.
+    participant_ids = [str(p) for p in chat["participants"]]
+    payload = await record_delivery(
+        db,
+        [p for p in participant_ids if p != user_id],
+        ChatEventType.MESSAGE_RECEIVED_EVENT,
+        message.model_dump(mode="json", by_alias=True),
+    )
+    rooms, skip_sids = chat_fanout(chat_id, user_id, participant_ids)
+    dispatch_socket_event(
+        sio, rooms, ChatEventType.MESSAGE_RECEIVED_EVENT, payload, skip_sids
     )
-    message_data = list(message_data)[0]
+    await update_inbox_last_message(db, ObjectId(chat_id), message_data, sender)
     return SendMessageResponse(
         statusCode=201,
-        data=message_data,
+        data=message,
         message="Message sent successfully",
         success=True,
     )
+
+
+async def mark_chat_as_read(
+    token: dict,
+    chat_id: str,
+    message_id: str | None,
+    db: AsyncIOMotorDatabase,
+    sio: AsyncServer,
+):
+    user_id = token["_id"]
+    chat = await db.chats.find_one({"_id": ObjectId(chat_id)}, {"participants": 1})
+    if not chat:
+        raise HTTPException(status_code=404, detail="Chat does not exist")
+    if ObjectId(user_id) not in chat["participants"]:
+        raise HTTPException(
+            status_code=400, detail="User is not a participant of this chat"
+        )
+
+    if message_id:
+        if not ObjectId.is_valid(message_id):
+            raise HTTPException(status_code=400, detail="Invalid message id")
+        message = await db.chatmessages.find_one(
+            {"_id": ObjectId(message_id), "chat": ObjectId(chat_id)},
+            {"createdAt": 1},
+        )
+    else:
+        message = await db.chatmessages.find_one(
+            {"chat": ObjectId(chat_id)},
+            {"createdAt": 1},
+            sort=[("createdAt", -1), ("_id", -1)],
+        )
+    if not message:
+        raise HTTPException(status_code=404, detail="Message does not exist")
+
+    entry = await mark_inbox_read(db, ObjectId(chat_id), ObjectId(user_id), message)
+    if not entry or not entry.get("lastReadMessage"):
+        raise HTTPException(status_code=404, detail="Chat does not exist")
+
+    # Reports the stored pointer, which stays put for a message older than it.
+    receipt = {
+        "chatId": str(chat_id),
+        "userId": str(user_id),
+        "lastReadMessage": str(entry["lastReadMessage"]),
+        "unreadCount": entry["unreadCount"],
+    }
+    await emit_socket_event(
+        sio,
+        [str(p) for p in chat["participants"] if str(p) != user_id],
+        ChatEventType.MESSAGE_READ_EVENT,
+        receipt,
+    )
+
+    return ReadReceiptResponse(
+        statusCode=200,
+        data=receipt,
+        message="Chat marked as read",
+        success=True,
+    )
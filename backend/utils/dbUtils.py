@@ -1,17 +1,25 @@
-from pymongo import MongoClient
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
 import os
 
-client: MongoClient | None = None
+client: AsyncIOMotorClient | None = None
 
 
-def get_client() -> MongoClient:
+def connect_client() -> AsyncIOMotorClient:
     global client
     if client is None:
         MONGODB_URI = os.environ.get("DATABASE_URI")
-        client = MongoClient(MONGODB_URI).cyphertalk
+        client = AsyncIOMotorClient(
+            MONGODB_URI,
+            maxPoolSize=int(os.environ.get("DATABASE_MAX_POOL_SIZE", 100)),
+            minPoolSize=int(os.environ.get("DATABASE_MIN_POOL_SIZE", 0)),
+        )
     return client
 
 
+def get_client() -> AsyncIOMotorDatabase:
+    return connect_client().cyphertalk
+
+
 def close_client():
     global client
     if client is not None:
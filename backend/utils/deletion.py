@@ -0,0 +1,139 @@
+from datetime import datetime, timedelta
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
+from bson import ObjectId
+import asyncio
+import os
+from utils.file_handling import release_attachment_references
+
+DELETION_BATCH_SIZE = int(os.environ.get("DELETION_BATCH_SIZE", 500))
+DELETION_LEASE_SECONDS = int(os.environ.get("DELETION_LEASE_SECONDS", 120))
+DELETION_POLL_SECONDS = int(os.environ.get("DELETION_POLL_SECONDS", 30))
+
+# Chat deletion only removes the chat document on the request path. Its messages
+# and attachments are cleaned up here in bounded batches, tracked by a deletionjobs
+# document that doubles as the tombstone and progress record.
+deletion_wakeup = asyncio.Event()
+deletion_worker: asyncio.Task | None = None
+
+
+async def schedule_chat_deletion(db: AsyncIOMotorDatabase, chat_id: ObjectId):
+    await db.deletionjobs.update_one(
+        {"chat": chat_id},
+        {
+            "$setOnInsert": {
+                "status": "pending",
+                "deletedMessages": 0,
+                "releasedAttachments": 0,
+                "inFlight": [],
+                "createdAt": datetime.now(),
+            }
+        },
+        upsert=True,
+    )
+    deletion_wakeup.set()
+
+
+async def claim_job(db: AsyncIOMotorDatabase) -> dict | None:
+    now = datetime.now()
+    # Jobs whose lease lapsed belonged to a worker that crashed and are resumed.
+    return await db.deletionjobs.find_one_and_update(
+        {
+            "$or": [
+                {"status": "pending"},
+                {"status": "running", "leaseUntil": {"$lt": now}},
+            ]
+        },
+        {
+            "$set": {
+                "status": "running",
+                "leaseUntil": now + timedelta(seconds=DELETION_LEASE_SECONDS),
+            }
+        },
+        sort=[("createdAt", 1)],
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+async def run_deletion_job(db: AsyncIOMotorDatabase, job: dict):
+    if job.get("inFlight"):
+        # A previous run may already have released these messages' attachments;
+        # deleting without releasing again can at worst leak a file, never drop a
+        # file another chat still references.
+        await db.chatmessages.delete_many({"_id": {"$in": job["inFlight"]}})
+        await db.deletionjobs.update_one({"_id": job["_id"]}, {"$set": {"inFlight": []}})
+
+    while True:
+        batch = await db.chatmessages.find(
+            {"chat": job["chat"]}, {"attachments.localPath": 1}
+        ).limit(DELETION_BATCH_SIZE).to_list(None)
+        if not batch:
+            break
+
+        message_ids = [message["_id"] for message in batch]
+        attachments = [
+            attachment
+            for message in batch
+            for attachment in message.get("attachments", [])
+            if attachment.get("localPath")
+        ]
+        await db.deletionjobs.update_one(
+            {"_id": job["_id"]},
+            {
+                "$set": {
+                    "inFlight": message_ids,
+                    "leaseUntil": datetime.now() + timedelta(seconds=DELETION_LEASE_SECONDS),
+                }
+            },
+        )
+        await release_attachment_references(db, attachments)
+        await db.chatmessages.delete_many({"_id": {"$in": message_ids}})
+        await db.deletionjobs.update_one(
+            {"_id": job["_id"]},
+            {
+                "$set": {"inFlight": []},
+                "$inc": {
+                    "deletedMessages": len(message_ids),
+                    "releasedAttachments": len(attachments),
+                },
+            },
+        )
+
+    job = await db.deletionjobs.find_one_and_update(
+        {"_id": job["_id"]},
+        {"$set": {"status": "done", "finishedAt": datetime.now()}},
+        return_document=ReturnDocument.AFTER,
+    )
+    print(
+        f"Deleted chat {job['chat']}: {job['deletedMessages']} messages, "
+        f"{job['releasedAttachments']} attachments"
+    )
+
+
+async def deletion_loop(db: AsyncIOMotorDatabase):
+    while True:
+        deletion_wakeup.clear()
+        try:
+            job = await claim_job(db)
+            if job:
+                await run_deletion_job(db, job)
+                continue
+        except Exception as e:
+            print(f"Chat deletion job failed: {e}")
+        try:
+            await asyncio.wait_for(deletion_wakeup.wait(), DELETION_POLL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+
+
+def start_deletion_worker(db: AsyncIOMotorDatabase):
+    global deletion_worker
+    deletion_worker = asyncio.create_task(deletion_loop(db))
+
+
+async def stop_deletion_worker():
+    global deletion_worker
+    if deletion_worker is not None:
+        deletion_worker.cancel()
+        await asyncio.gather(deletion_worker, return_exceptions=True)
+        deletion_worker = None
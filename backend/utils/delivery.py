@@ -0,0 +1,87 @@
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from bson import ObjectId
+from datetime import datetime
+import itertools
+import os
+import random
+import time
+
+DELIVERY_LOG_TTL_SECONDS = int(os.environ.get("DELIVERY_LOG_TTL_SECONDS", 86400))
+DELIVERY_REPLAY_LIMIT = int(os.environ.get("DELIVERY_REPLAY_LIMIT", 500))
+DELIVERY_GRACE_MS = int(os.environ.get("DELIVERY_GRACE_MS", 10000))
+
+# Chat list and message events are also written to a delivery log under a
+# time-ordered sequence. Clients remember the highest seq they saw and send it
+# as auth.lastSeq when reconnecting to get only what they missed.
+#
+# A sequence is the milliseconds since SEQUENCE_EPOCH_MS with a per-process
+# counter in the low bits, so no write waits on a shared counter document and
+# the value stays below 2**53 for JavaScript clients until 2093. Events stamped
+# before lastSeq can still be logged after it, so replay reaches back
+# DELIVERY_GRACE_MS further; clients skip events they already handled. Two
+# processes can still stamp the same seq, so clients key handled events on the
+# event name and payload _id together with the seq.
+SEQUENCE_EPOCH_MS = 1704067200000  # 2024-01-01T00:00:00Z
+SEQUENCE_COUNTER_BITS = 12
+SEQUENCE_COUNTER_MASK = (1 << SEQUENCE_COUNTER_BITS) - 1
+# Random start so two processes stamping in the same millisecond rarely collide.
+sequence_counter = itertools.count(random.randrange(SEQUENCE_COUNTER_MASK + 1))
+
+
+def sequence_at(timestamp_ms: int) -> int:
+    return (timestamp_ms - SEQUENCE_EPOCH_MS) << SEQUENCE_COUNTER_BITS
+
+
+def sequence_time_ms(seq: int) -> int:
+    return (seq >> SEQUENCE_COUNTER_BITS) + SEQUENCE_EPOCH_MS
+
+
+def next_sequence() -> int:
+    now_ms = time.time_ns() // 1_000_000
+    return sequence_at(now_ms) | (next(sequence_counter) & SEQUENCE_COUNTER_MASK)
+
+
+async def record_delivery(
+    db: AsyncIOMotorDatabase, user_ids: list[str], event: str, payload: dict
+) -> dict:
+    """Log an event for its recipients and return the payload stamped with its seq."""
+    payload = {**payload, "seq": next_sequence()}
+    if user_ids:
+        await db.deliverylog.insert_one(
+            {
+                "users": [ObjectId(user_id) for user_id in user_ids],
+                "seq": payload["seq"],
+                "event": event,
+                "payload": payload,
+                "createdAt": datetime.now(),
+            }
+        )
+    return payload
+
+
+async def missed_deliveries(
+    db: AsyncIOMotorDatabase, user_id: str, last_seq: int | None
+) -> dict:
+    """Events since last_seq, plus the sequence the client can resume from next time."""
+    # Taken first: anything logged after this is still emitted live to the socket.
+    current = sequence_at(time.time_ns() // 1_000_000)
+    if last_seq is None:
+        return {"events": [], "truncated": False, "lastSeq": current}
+    since = last_seq - (DELIVERY_GRACE_MS << SEQUENCE_COUNTER_BITS)
+    entries = await db.deliverylog.find(
+        {"users": ObjectId(user_id), "seq": {"$gt": since}},
+        {"_id": 0, "seq": 1, "event": 1, "payload": 1},
+    ).sort("seq", 1).limit(DELIVERY_REPLAY_LIMIT + 1).to_list(None)
+    # Past the limit, or when entries after lastSeq may already have expired,
+    # the client should refetch its chat list instead.
+    truncated = len(entries) > DELIVERY_REPLAY_LIMIT or log_expired_since(since)
+    return {
+        "events": entries[:DELIVERY_REPLAY_LIMIT],
+        "truncated": truncated,
+        "lastSeq": current,
+    }
+
+
+def log_expired_since(seq: int) -> bool:
+    expired_before_ms = (time.time() - DELIVERY_LOG_TTL_SECONDS) * 1000
+    return sequence_time_ms(seq) < expired_before_ms
@@ -1,29 +1,211 @@
-from fastapi import FastAPI, File, UploadFile, Request
+from fastapi import HTTPException, UploadFile, Request
 from fastapi.responses import JSONResponse
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateOne, ReturnDocument
+from collections import Counter
 from pathlib import Path
 from datetime import datetime
-import random
-import shutil
-from typing import Annotated
+import asyncio
+import hashlib
+import os
+import uuid
 
 UPLOAD_DIRECTORY = "./public/images"
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+MAX_UPLOAD_SIZE = int(os.environ.get("MAX_UPLOAD_SIZE", 25 * 1024 * 1024))
+# Whole request bodies, enforced before Starlette spools multipart uploads to
+# disk; MAX_UPLOAD_SIZE still applies to each file.
+MAX_REQUEST_SIZE = int(os.environ.get("MAX_REQUEST_SIZE", 5 * MAX_UPLOAD_SIZE + 1024 * 1024))
 Path(UPLOAD_DIRECTORY).mkdir(parents=True, exist_ok=True)
 
 
-async def upload_file(file: bytes, request: Request):
+class RequestSizeLimitMiddleware:
+    """Reject request bodies larger than MAX_REQUEST_SIZE while they arrive."""
+
+    def __init__(self, app, max_size: int = MAX_REQUEST_SIZE):
+        self.app = app
+        self.max_size = max_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        detail = f"Request body exceeds the {self.max_size} byte limit"
+        content_length = dict(scope["headers"]).get(b"content-length", b"")
+        if content_length.isdigit() and int(content_length) > self.max_size:
+            response = JSONResponse({"detail": detail}, status_code=413)
+            await response(scope, receive, send)
+            return
+
+        # Chunked bodies carry no Content-Length; count them as they are read.
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_size:
+                    raise HTTPException(status_code=413, detail=detail)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+def _write_chunk(buffer, digest, chunk: bytes):
+    digest.update(chunk)
+    buffer.write(chunk)
+
+
+async def upload_file(file: UploadFile, request: Request, db: AsyncIOMotorDatabase):
+    """Stream an upload to disk off the event loop, storing it under its content hash.
+
+    Identical uploads resolve to the same file. The returned upload holds one
+    reference in the attachments collection, which the caller must release if
+    the upload ends up unused.
+    """
+    file_extension = Path(file.filename).suffix.lower()
+    destination = Path(UPLOAD_DIRECTORY) / f".upload-{uuid.uuid4().hex}"
+    digest = hashlib.sha256()
+    size = 0
+    buffer = await asyncio.to_thread(destination.open, "wb")
     try:
-        filename = Path(file.filename)
-        file_extension = filename.suffix
-        filename_without_extension = filename.stem.lower().replace(" ", "-")
-        unique_filename = f"{filename_without_extension}-{datetime.now().strftime('%Y%m%d%H%M%S')}-{random.randint(0, 100000)}{file_extension}"
-
-        destination = Path(UPLOAD_DIRECTORY) / unique_filename
-        with destination.open("wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        return {
-            "url": f"{request.base_url}images/{unique_filename}",
-            "localPath": str(destination)
-        }
-    except Exception as e:
-        print(e)
-        return JSONResponse(status_code=500, content={"message": "Error while uploading file"})
\ No newline at end of file
+        while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+            size += len(chunk)
+            if size > MAX_UPLOAD_SIZE:
+                raise HTTPException(
+                    status_code=413,
+                    detail=f"{file.filename} exceeds the {MAX_UPLOAD_SIZE} byte upload limit",
+                )
+            await asyncio.to_thread(_write_chunk, buffer, digest, chunk)
+    except BaseException:
+        await asyncio.to_thread(buffer.close)
+        destination.unlink(missing_ok=True)
+        raise
+    await asyncio.to_thread(buffer.close)
+
+    stored_filename = f"{digest.hexdigest()}{file_extension}"
+    stored_path = Path(UPLOAD_DIRECTORY) / stored_filename
+    upload = {
+        "url": f"{request.base_url}media/{stored_filename}",
+        "localPath": str(stored_path),
+        "hash": digest.hexdigest(),
+        "size": size,
+    }
+    # Take the reference before the file is put in place, then always replace it:
+    # an existing copy may be mid-release, and the content is identical anyway.
+    try:
+        await add_attachment_references(db, [upload])
+    except BaseException:
+        destination.unlink(missing_ok=True)
+        raise
+    await asyncio.to_thread(os.replace, destination, stored_path)
+    return upload
+
+
+async def upload_files(
+    files: list[UploadFile], request: Request, db: AsyncIOMotorDatabase
+) -> list[dict]:
+    """Upload several files concurrently, failing the whole batch if any one fails."""
+    results = await asyncio.gather(
+        *(upload_file(file, request, db) for file in files), return_exceptions=True
+    )
+    errors = [result for result in results if isinstance(result, BaseException)]
+    if errors:
+        await release_attachment_references(
+            db, [result for result in results if not isinstance(result, BaseException)]
+        )
+        if isinstance(errors[0], HTTPException):
+            raise errors[0]
+        print(errors[0])
+        raise HTTPException(status_code=500, detail="Error while uploading file")
+    return results
+
+
+def attachment_key(attachment: dict) -> str:
+    return Path(attachment["localPath"]).name
+
+
+async def add_attachment_references(db: AsyncIOMotorDatabase, attachments: list[dict]):
+    counts = Counter(attachment_key(attachment) for attachment in attachments)
+    if not counts:
+        return
+    by_key = {attachment_key(attachment): attachment for attachment in attachments}
+    await db.attachments.bulk_write(
+        [
+            UpdateOne(
+                {"_id": key},
+                {
+                    "$inc": {"refCount": count},
+                    "$setOnInsert": {
+                        "hash": by_key[key]["hash"],
+                        "localPath": by_key[key]["localPath"],
+                        "size": by_key[key]["size"],
+                        "createdAt": datetime.now(),
+                    },
+                },
+                upsert=True,
+            )
+            for key, count in counts.items()
+        ],
+        ordered=False,
+    )
+
+
+def _move_aside(paths: list[Path]) -> list[tuple[Path, Path]]:
+    moved = []
+    for path in paths:
+        aside = path.with_name(f".release-{uuid.uuid4().hex}")
+        try:
+            os.replace(path, aside)
+        except FileNotFoundError:
+            continue
+        moved.append((path, aside))
+    return moved
+
+
+def _move_back(moved: list[tuple[Path, Path]]):
+    for path, aside in moved:
+        if path.exists():
+            aside.unlink(missing_ok=True)
+        else:
+            os.replace(aside, path)
+
+
+async def _release_attachment(db: AsyncIOMotorDatabase, key: str, count: int, local_path: str):
+    stored = await db.attachments.find_one_and_update(
+        {"_id": key},
+        {"$inc": {"refCount": -count}},
+        return_document=ReturnDocument.AFTER,
+    )
+    if stored is None:
+        # Uploaded before content addressing; nothing else can reference it.
+        await asyncio.to_thread(Path(local_path).unlink, missing_ok=True)
+        return
+    if stored["refCount"] > 0:
+        return
+    paths = [Path(stored["localPath"])] + [
+        Path(UPLOAD_DIRECTORY) / "variants" / filename
+        for filename in stored.get("variants", {}).values()
+    ]
+    # Move the files aside before dropping the row. An upload that takes a new
+    # reference after this point puts its own copy in place, so removing ours can
+    # never delete a file a live row points at.
+    moved = await asyncio.to_thread(_move_aside, paths)
+    deleted = await db.attachments.delete_one({"_id": key, "refCount": {"$lte": 0}})
+    if deleted.deleted_count:
+        await asyncio.gather(
+            *(asyncio.to_thread(aside.unlink, missing_ok=True) for _, aside in moved)
+        )
+    else:
+        # Referenced again in the meantime; restore whatever was not replaced.
+        await asyncio.to_thread(_move_back, moved)
+
+
+async def release_attachment_references(db: AsyncIOMotorDatabase, attachments: list[dict]):
+    """Drop one reference per attachment, unlinking files nobody references anymore."""
+    counts = Counter(attachment_key(attachment) for attachment in attachments)
+    paths = {attachment_key(attachment): attachment["localPath"] for attachment in attachments}
+    await asyncio.gather(
+        *(_release_attachment(db, key, count, paths[key]) for key, count in counts.items())
+    )
@@ -0,0 +1,143 @@
+from concurrent.futures import ProcessPoolExecutor
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from PIL import Image, ImageOps
+from pathlib import Path
+from bson import ObjectId
+import asyncio
+import multiprocessing
+import os
+import re
+import uuid
+from utils.file_handling import UPLOAD_DIRECTORY, attachment_key
+
+VARIANT_DIRECTORY = f"{UPLOAD_DIRECTORY}/variants"
+VARIANT_SIZES = {"thumb": 200, "medium": 800}
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".gif", ".bmp"}
+IMAGE_VARIANT_WORKERS = int(os.environ.get("IMAGE_VARIANT_WORKERS", 2))
+MEDIA_FILENAME = re.compile(r"^[0-9a-f]{64}(\.[a-z0-9]+)?$")
+Path(VARIANT_DIRECTORY).mkdir(parents=True, exist_ok=True)
+
+executor: ProcessPoolExecutor | None = None
+# Strong references to in-flight variant jobs so they are not garbage collected.
+variant_jobs: set = set()
+
+
+def start_variant_pool():
+    # Spawned, not forked: a fork of the running server would copy its event
+    # loop, Motor client and socket threads into every worker.
+    global executor
+    if executor is None:
+        executor = ProcessPoolExecutor(
+            max_workers=IMAGE_VARIANT_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+
+
+def get_variant_pool() -> ProcessPoolExecutor:
+    start_variant_pool()
+    return executor
+
+
+def shutdown_variant_pool():
+    global executor
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
+        executor = None
+
+
+def render_variants(source_path: str, key: str) -> dict[str, str]:
+    """Write a WebP variant per configured size. Runs in a worker process."""
+    variants = {}
+    stem = Path(key).stem
+    with Image.open(source_path) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ("RGB", "RGBA"):
+            has_alpha = image.mode in ("LA", "PA") or "transparency" in image.info
+            image = image.convert("RGBA" if has_alpha else "RGB")
+        for size, max_dimension in VARIANT_SIZES.items():
+            filename = f"{stem}-{size}.webp"
+            target = Path(VARIANT_DIRECTORY) / filename
+            if not target.exists():
+                variant = image.copy()
+                variant.thumbnail((max_dimension, max_dimension))
+                # Written aside and renamed so the media route never serves (and
+                # browsers never cache) a half-written file; concurrent renders of
+                # the same image each replace it with identical bytes.
+                partial = Path(VARIANT_DIRECTORY) / f".variant-{uuid.uuid4().hex}"
+                try:
+                    variant.save(partial, "WEBP", quality=80, method=4)
+                    os.replace(partial, target)
+                finally:
+                    partial.unlink(missing_ok=True)
+            variants[size] = filename
+    return variants
+
+
+def is_image(attachment: dict) -> bool:
+    return Path(attachment["localPath"]).suffix.lower() in IMAGE_EXTENSIONS
+
+
+def variant_urls(base_url: str, key: str, variants: dict[str, str]) -> dict[str, str]:
+    return {size: f"{base_url}media/{key}?size={size}" for size in variants}
+
+
+def media_path(filename: str, size: str | None = None) -> Path | None:
+    """Resolve a content-addressed filename (and optional size) to a file on disk."""
+    if not MEDIA_FILENAME.match(filename):
+        return None
+    if size in VARIANT_SIZES:
+        variant = Path(VARIANT_DIRECTORY) / f"{Path(filename).stem}-{size}.webp"
+        if variant.exists():
+            return variant
+    original = Path(UPLOAD_DIRECTORY) / filename
+    return original if original.exists() else None
+
+
+async def apply_known_variants(
+    db: AsyncIOMotorDatabase, attachments: list[dict], base_url: str
+) -> list[dict]:
+    """Fill in variants already rendered for deduplicated files; return those still pending."""
+    pending = []
+    for attachment in attachments:
+        if not is_image(attachment):
+            continue
+        key = attachment_key(attachment)
+        stored = await db.attachments.find_one({"_id": key}, {"variants": 1})
+        if stored and stored.get("variants"):
+            attachment["variants"] = variant_urls(base_url, key, stored["variants"])
+        else:
+            pending.append(attachment)
+    return pending
+
+
+async def generate_message_variants(
+    db: AsyncIOMotorDatabase, message_id: ObjectId, attachments: list[dict], base_url: str
+):
+    loop = asyncio.get_running_loop()
+    for attachment in attachments:
+        key = attachment_key(attachment)
+        try:
+            variants = await loop.run_in_executor(
+                get_variant_pool(), render_variants, attachment["localPath"], key
+            )
+        except Exception as e:
+            print(f"Failed to generate variants for {key}: {e}")
+            continue
+        await db.attachments.update_one({"_id": key}, {"$set": {"variants": variants}})
+        await db.chatmessages.update_one(
+            {"_id": message_id},
+            {"$set": {"attachments.$[a].variants": variant_urls(base_url, key, variants)}},
+            array_filters=[{"a.localPath": attachment["localPath"]}],
+        )
+
+
+def schedule_message_variants(
+    db: AsyncIOMotorDatabase, message_id: ObjectId, attachments: list[dict], base_url: str
+):
+    if not attachments:
+        return
+    task = asyncio.create_task(
+        generate_message_variants(db, message_id, attachments, base_url)
+    )
+    variant_jobs.add(task)
+    task.add_done_callback(variant_jobs.discard)
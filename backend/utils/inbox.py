@@ -0,0 +1,315 @@
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument, UpdateMany, UpdateOne
+from bson import ObjectId
+from utils.user_cache import get_user_profiles, user_summary
+import os
+import time
+
+# Per-user chat list entries, one document per (user, chat). Maintained on every
+# write that changes what the chat list shows so listing chats needs no joins.
+# Every write stamps the entries it touches with the time in milliseconds as
+# their version, and removals leave a tombstone, so clients can ask for changes
+# since a version.
+PREVIEW_LENGTH = 120
+ACTIVE = {"deleted": {"$ne": True}}
+# How far behind the clock handed-out versions are. A write stamped before a read
+# can land after it; as long as it lands within this window the next request for
+# changes still returns it. Clients see entries in the window twice and merge them.
+INBOX_CHANGES_GRACE_MS = int(os.environ.get("INBOX_CHANGES_GRACE_MS", 10000))
+INBOX_RECOUNT_ATTEMPTS = 3
+CHAT_LIST_FIELDS = (
+    "__v",
+    "name",
+    "isGroupChat",
+    "participants",
+    "admin",
+    "createdAt",
+    "updatedAt",
+    "lastMessage",
+    "unreadCount",
+    "lastReadMessage",
+)
+CHAT_LIST_DEFAULTS = {"__v": 0, "lastMessage": None, "unreadCount": 0, "lastReadMessage": None}
+
+
+def next_inbox_version() -> int:
+    return time.time_ns() // 1_000_000
+
+
+def current_inbox_version() -> int:
+    """Low-water mark clients resume from: every write stamped before it has landed."""
+    return next_inbox_version() - INBOX_CHANGES_GRACE_MS
+
+
+def message_preview(message: dict, sender: dict | None) -> dict:
+    return {
+        "_id": message["_id"],
+        "__v": message.get("__v", 0),
+        "sender": sender,
+        "content": (message.get("content") or "")[:PREVIEW_LENGTH],
+        "attachments": message.get("attachments", []),
+        "chat": message["chat"],
+        "createdAt": message["createdAt"],
+        "updatedAt": message["updatedAt"],
+    }
+
+
+def chat_from_inbox(entry: dict) -> dict:
+    """The chat list item for an entry, in the shape ChatListItem serializes to.
+
+    Only the item's own fields are copied, so internal ones (user, version,
+    deleted, lastReadAt) never reach FAST_JSON responses, and missing optional
+    fields get the same defaults Pydantic would fill in.
+    """
+    chat = {"_id": entry["chat"]}
+    for field in CHAT_LIST_FIELDS:
+        if field in entry:
+            chat[field] = entry[field]
+        elif field in CHAT_LIST_DEFAULTS:
+            chat[field] = CHAT_LIST_DEFAULTS[field]
+    return chat
+
+
+async def sync_chat_inbox(db: AsyncIOMotorDatabase, chat_id: ObjectId):
+    """Rebuild every participant's inbox entry for a chat from the source documents."""
+    chat = await db.chats.find_one({"_id": chat_id})
+    if not chat:
+        await remove_chat_inbox(db, chat_id)
+        return
+
+    message = None
+    if chat.get("lastMessage"):
+        message = await db.chatmessages.find_one({"_id": chat["lastMessage"]})
+
+    user_ids = list(chat["participants"])
+    if message:
+        user_ids.append(message["sender"])
+    profiles = await get_user_profiles(db, user_ids)
+    participants = [
+        user_summary(profiles[participant])
+        for participant in chat["participants"]
+        if participant in profiles
+    ]
+
+    last_message = None
+    if message:
+        sender = profiles.get(message["sender"])
+        last_message = message_preview(message, user_summary(sender) if sender else None)
+
+    fields = {
+        "name": chat["name"],
+        "isGroupChat": chat["isGroupChat"],
+        "admin": chat["admin"],
+        "participants": participants,
+        "lastMessage": last_message,
+        "createdAt": chat["createdAt"],
+        "updatedAt": chat["updatedAt"],
+        "__v": chat.get("__v", 0),
+        "deleted": False,
+        "version": next_inbox_version(),
+    }
+    operations = [
+        UpdateOne(
+            {"user": participant, "chat": chat_id},
+            {
+                "$set": fields,
+                "$setOnInsert": {"unreadCount": 0, "lastReadMessage": None},
+            },
+            upsert=True,
+        )
+        for participant in chat["participants"]
+    ]
+    if operations:
+        await db.inboxes.bulk_write(operations, ordered=False)
+    await db.inboxes.update_many(
+        {"chat": chat_id, "user": {"$nin": chat["participants"]}, **ACTIVE},
+        {"$set": {"deleted": True, "version": fields["version"]}},
+    )
+
+
+async def update_chat_inbox(db: AsyncIOMotorDatabase, chat_id: ObjectId, fields: dict):
+    await db.inboxes.update_many(
+        {"chat": chat_id, **ACTIVE},
+        {"$set": {**fields, "version": next_inbox_version()}},
+    )
+
+
+def stored_before(message: dict, at_field: str, id_field: str) -> dict:
+    """Filter for documents whose stored message pointer is unset or older than `message`.
+
+    Pointers compare by (createdAt, _id), the order messages are listed in.
+    """
+    return {
+        "$or": [
+            {at_field: None},
+            {at_field: {"$lt": message["createdAt"]}},
+            {at_field: message["createdAt"], id_field: {"$lt": message["_id"]}},
+        ]
+    }
+
+
+async def update_inbox_last_message(
+    db: AsyncIOMotorDatabase, chat_id: ObjectId, message: dict, sender: dict
+):
+    """Store the new preview and bump unread counters for everyone but the sender.
+
+    Sends can land out of order, so the preview only replaces an older one and
+    the sender's read pointer only moves forward; the counters always count.
+    """
+    version = next_inbox_version()
+    await db.inboxes.bulk_write(
+        [
+            UpdateMany(
+                {"chat": chat_id, "user": {"$ne": sender["_id"]}, **ACTIVE},
+                {"$inc": {"unreadCount": 1}, "$set": {"version": version}},
+            ),
+            UpdateMany(
+                {
+                    "chat": chat_id,
+                    **ACTIVE,
+                    **stored_before(message, "lastMessage.createdAt", "lastMessage._id"),
+                },
+                {
+                    "$set": {
+                        "lastMessage": message_preview(message, sender),
+                        "updatedAt": message["createdAt"],
+                        "version": version,
+                    }
+                },
+            ),
+            UpdateOne(
+                {
+                    "chat": chat_id,
+                    "user": sender["_id"],
+                    **stored_before(message, "lastReadAt", "lastReadMessage"),
+                },
+                {
+                    "$set": {
+                        "unreadCount": 0,
+                        "lastReadMessage": message["_id"],
+                        "lastReadAt": message["createdAt"],
+                        "version": version,
+                    }
+                },
+            ),
+        ],
+        ordered=False,
+    )
+
+
+def after_message(message_id: ObjectId, created_at) -> dict:
+    """Filter for chat messages ordered after the given one."""
+    return {
+        "$or": [
+            {"createdAt": {"$gt": created_at}},
+            {"createdAt": created_at, "_id": {"$gt": message_id}},
+        ]
+    }
+
+
+async def count_unread(db: AsyncIOMotorDatabase, entry: dict) -> int:
+    """Messages from others after the read pointer, up to the entry's last message.
+
+    Later messages are left out: their own inbox update increments the count.
+    """
+    last_message = entry.get("lastMessage")
+    if not last_message:
+        return 0
+    query = {
+        "chat": entry["chat"],
+        "sender": {"$ne": entry["user"]},
+        "$and": [
+            {
+                "$or": [
+                    {"createdAt": {"$lt": last_message["createdAt"]}},
+                    {"createdAt": last_message["createdAt"], "_id": {"$lte": last_message["_id"]}},
+                ]
+            }
+        ],
+    }
+    if entry.get("lastReadMessage") and entry.get("lastReadAt"):
+        query["$and"].append(after_message(entry["lastReadMessage"], entry["lastReadAt"]))
+    return await db.chatmessages.count_documents(query)
+
+
+async def mark_inbox_read(
+    db: AsyncIOMotorDatabase, chat_id: ObjectId, user_id: ObjectId, message: dict
+) -> dict | None:
+    """Move the user's read pointer forward to `message` and recount what is unread.
+
+    The pointer never moves backwards, so a stale receipt leaves it alone. Returns
+    the entry as stored afterwards.
+    """
+    entry_filter = {"chat": chat_id, "user": user_id, **ACTIVE}
+    await db.inboxes.update_one(
+        {
+            **entry_filter,
+            # Also matches entries read before lastReadAt was stored.
+            **stored_before(message, "lastReadAt", "lastReadMessage"),
+        },
+        {
+            "$set": {
+                "lastReadMessage": message["_id"],
+                "lastReadAt": message["createdAt"],
+                "version": next_inbox_version(),
+            }
+        },
+    )
+    # The count is only written if the pointer, the last message and the counter
+    # itself are unchanged since it was taken, so a concurrent $inc is never lost.
+    for _ in range(INBOX_RECOUNT_ATTEMPTS):
+        entry = await db.inboxes.find_one(entry_filter)
+        if entry is None:
+            return None
+        unread_count = await count_unread(db, entry)
+        last_message = entry.get("lastMessage")
+        updated = await db.inboxes.find_one_and_update(
+            {
+                "_id": entry["_id"],
+                "lastReadMessage": entry.get("lastReadMessage"),
+                "lastMessage._id": last_message["_id"] if last_message else None,
+                "unreadCount": entry.get("unreadCount"),
+            },
+            {"$set": {"unreadCount": unread_count, "version": next_inbox_version()}},
+            return_document=ReturnDocument.AFTER,
+        )
+        if updated is not None:
+            return updated
+    # Still changing under heavy traffic; the next message or read settles it.
+    return entry
+
+
+async def remove_chat_inbox(db: AsyncIOMotorDatabase, chat_id: ObjectId):
+    await db.inboxes.update_many(
+        {"chat": chat_id, **ACTIVE},
+        {"$set": {"deleted": True, "version": next_inbox_version()}},
+    )
+
+
+async def get_user_inbox(db: AsyncIOMotorDatabase, user_id: ObjectId) -> list[dict]:
+    entries = await db.inboxes.find({"user": user_id, **ACTIVE}).sort("updatedAt", -1).to_list(None)
+    return [chat_from_inbox(entry) for entry in entries]
+
+
+async def get_user_inbox_changes(
+    db: AsyncIOMotorDatabase, user_id: ObjectId, since: int
+) -> dict:
+    """Entries changed after version `since`, split into live chats and removed chat ids."""
+    # Taken before the query; entries between it and now are returned again next time.
+    version = current_inbox_version()
+    entries = await db.inboxes.find(
+        {"user": user_id, "version": {"$gt": since}}
+    ).sort("version", 1).to_list(None)
+    return {
+        "chats": [chat_from_inbox(entry) for entry in entries if not entry.get("deleted")],
+        "removed": [entry["chat"] for entry in entries if entry.get("deleted")],
+        "version": version,
+    }
+
+
+async def backfill_inboxes(db: AsyncIOMotorDatabase):
+    """Populate the inbox collection from existing chats the first time it is used."""
+    if await db.inboxes.estimated_document_count():
+        return
+    async for chat in db.chats.find({}, {"_id": 1}):
+        await sync_chat_inbox(db, chat["_id"])
@@ -0,0 +1,132 @@
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from bson import ObjectId
+import os
+from utils.delivery import DELIVERY_LOG_TTL_SECONDS
+
+INDEXES: dict[str, list[IndexModel]] = {
+    "chatmessages": [
+        IndexModel(
+            [("chat", ASCENDING), ("createdAt", DESCENDING), ("_id", DESCENDING)],
+            name="chat_createdAt_id",
+        ),
+        IndexModel(
+            [("sender", ASCENDING), ("clientMessageId", ASCENDING)],
+            name="sender_clientMessageId_unique",
+            unique=True,
+            partialFilterExpression={"clientMessageId": {"$type": "string"}},
+        ),
+    ],
+    "chats": [
+        IndexModel([("participants", ASCENDING), ("updatedAt", DESCENDING)], name="participants_updatedAt"),
+        IndexModel([("isGroupChat", ASCENDING), ("participants", ASCENDING)], name="isGroupChat_participants"),
+    ],
+    "inboxes": [
+        IndexModel([("user", ASCENDING), ("chat", ASCENDING)], name="user_chat_unique", unique=True),
+        IndexModel([("user", ASCENDING), ("updatedAt", DESCENDING)], name="user_updatedAt"),
+        IndexModel([("chat", ASCENDING)], name="chat"),
+        IndexModel([("user", ASCENDING), ("version", ASCENDING)], name="user_version"),
+    ],
+    "deletionjobs": [
+        IndexModel([("chat", ASCENDING)], name="chat_unique", unique=True),
+        IndexModel([("status", ASCENDING), ("createdAt", ASCENDING)], name="status_createdAt"),
+    ],
+    "deliverylog": [
+        IndexModel([("users", ASCENDING), ("seq", ASCENDING)], name="users_seq"),
+        IndexModel(
+            [("createdAt", ASCENDING)],
+            name="createdAt_ttl",
+            expireAfterSeconds=DELIVERY_LOG_TTL_SECONDS,
+        ),
+    ],
+    "mailqueue": [
+        IndexModel([("status", ASCENDING), ("nextAttemptAt", ASCENDING)], name="status_nextAttemptAt"),
+    ],
+    "users": [
+        IndexModel([("username", ASCENDING)], name="username_unique", unique=True),
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+        IndexModel([("emailVerificationToken", ASCENDING)], name="emailVerificationToken", sparse=True),
+        IndexModel([("forgotPasswordToken", ASCENDING)], name="forgotPasswordToken", sparse=True),
+    ],
+}
+
+
+def hot_queries():
+    # Filters/sorts mirroring the request paths that must never scan a whole collection.
+    sample_id = ObjectId()
+    return [
+        ("chatmessages", {"chat": sample_id}, [("createdAt", DESCENDING), ("_id", DESCENDING)]),
+        ("chats", {"participants": sample_id}, [("updatedAt", DESCENDING)]),
+        ("inboxes", {"user": sample_id}, [("updatedAt", DESCENDING)]),
+        ("inboxes", {"chat": sample_id}, None),
+        ("inboxes", {"user": sample_id, "version": {"$gt": 0}}, [("version", ASCENDING)]),
+        ("deliverylog", {"users": sample_id, "seq": {"$gt": 0}}, [("seq", ASCENDING)]),
+        ("chats", {"isGroupChat": False, "participants": {"$all": [sample_id, ObjectId()]}}, None),
+        ("users", {"username": ""}, None),
+        (
+            "users",
+            {"$or": [{"username": {"$regex": "^a"}}, {"email": {"$regex": "^a"}}]},
+            [("username", ASCENDING)],
+        ),
+        ("users", {"email": ""}, None),
+        ("users", {"emailVerificationToken": ""}, None),
+        ("users", {"forgotPasswordToken": ""}, None),
+    ]
+
+
+async def ensure_indexes(db: AsyncIOMotorDatabase, dry_run: bool = False) -> list[dict]:
+    """Create any missing indexes. With dry_run, only report what would be created."""
+    report = []
+    for collection, indexes in INDEXES.items():
+        existing = await db[collection].index_information()
+        missing = [index for index in indexes if index.document["name"] not in existing]
+        for index in indexes:
+            report.append(
+                {
+                    "collection": collection,
+                    "name": index.document["name"],
+                    "keys": dict(index.document["key"]),
+                    "status": "missing" if index in missing else "exists",
+                }
+            )
+        if missing and not dry_run:
+            await db[collection].create_indexes(missing)
+            for entry in report:
+                if entry["collection"] == collection and entry["status"] == "missing":
+                    entry["status"] = "created"
+    return report
+
+
+def _plan_stages(plan: dict):
+    yield plan.get("stage")
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            yield from _plan_stages(plan[key])
+    for child in plan.get("inputStages", []):
+        yield from _plan_stages(child)
+
+
+async def check_query_plans(db: AsyncIOMotorDatabase):
+    """Raise if any hot query's winning plan falls back to a collection scan."""
+    collscans = []
+    for collection, query, sort in hot_queries():
+        cursor = db[collection].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        explain = await cursor.explain()
+        winning_plan = explain["queryPlanner"]["winningPlan"]
+        if "COLLSCAN" in _plan_stages(winning_plan):
+            collscans.append(f"{collection} {query}")
+    if collscans:
+        raise RuntimeError(
+            "Hot queries fell back to COLLSCAN: " + "; ".join(collscans)
+        )
+
+
+async def bootstrap_indexes(db: AsyncIOMotorDatabase):
+    dry_run = os.environ.get("INDEX_DRY_RUN", "false").lower() == "true"
+    report = await ensure_indexes(db, dry_run=dry_run)
+    for entry in report:
+        print(f"Index {entry['collection']}.{entry['name']} {entry['keys']}: {entry['status']}")
+    if not dry_run:
+        await check_query_plans(db)
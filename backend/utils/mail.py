@@ -1,9 +1,12 @@
-import smtplib
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
+from datetime import datetime, timedelta
 from jinja2 import Environment, FileSystemLoader, select_autoescape
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
 from dotenv import load_dotenv
-import pdb
+import aiosmtplib
+import asyncio
 import os
 
 load_dotenv()
@@ -13,20 +16,163 @@ env = Environment(
     autoescape=select_autoescape(['html', 'xml'])
 )
 
-async def send_email(receiver_email, subject, html_content):
+SMTP_HOST = os.getenv("SMTP_HOST", "sandbox.smtp.mailtrap.io")
+SMTP_PORT = int(os.getenv("SMTP_PORT", 2525))
+MAIL_FROM = os.getenv("MAIL_FROM", "nmikealson@dmakwana.tech")
+MAIL_WORKERS = int(os.getenv("MAIL_WORKERS", 1))
+MAIL_BATCH_SIZE = int(os.getenv("MAIL_BATCH_SIZE", 20))
+MAIL_MAX_ATTEMPTS = int(os.getenv("MAIL_MAX_ATTEMPTS", 5))
+MAIL_RETRY_BASE_SECONDS = int(os.getenv("MAIL_RETRY_BASE_SECONDS", 30))
+MAIL_POLL_SECONDS = int(os.getenv("MAIL_POLL_SECONDS", 10))
+MAIL_CLAIM_TIMEOUT_SECONDS = int(os.getenv("MAIL_CLAIM_TIMEOUT_SECONDS", 300))
+
+# Outgoing mail is written to the mailqueue collection and drained by background
+# workers, so request handlers never wait on an SMTP round-trip.
+mail_wakeup = asyncio.Event()
+mail_workers: list[asyncio.Task] = []
+
+
+def build_message(receiver_email, subject, html_content):
     msg = MIMEMultipart()
-    msg['From'] = "nmikealson@dmakwana.tech"
+    msg['From'] = MAIL_FROM
     msg['To'] = receiver_email
     msg['Subject'] = subject
 
     msg.attach(MIMEText(html_content, 'html'))
+    return msg
+
+
+async def enqueue_email(db: AsyncIOMotorDatabase, receiver_email, subject, html_content):
+    await db.mailqueue.insert_one(
+        {
+            "to": receiver_email,
+            "subject": subject,
+            "html": html_content,
+            "status": "pending",
+            "attempts": 0,
+            "nextAttemptAt": datetime.now(),
+            "createdAt": datetime.now(),
+        }
+    )
+    mail_wakeup.set()
+
+
+async def claim_batch(db: AsyncIOMotorDatabase) -> list[dict]:
+    batch = []
+    while len(batch) < MAIL_BATCH_SIZE:
+        now = datetime.now()
+        # Mail claimed by a worker that died mid-send is picked up again once stale.
+        mail = await db.mailqueue.find_one_and_update(
+            {
+                "$or": [
+                    {"status": "pending", "nextAttemptAt": {"$lte": now}},
+                    {
+                        "status": "sending",
+                        "claimedAt": {
+                            "$lt": now - timedelta(seconds=MAIL_CLAIM_TIMEOUT_SECONDS)
+                        },
+                    },
+                ]
+            },
+            {"$set": {"status": "sending", "claimedAt": now}},
+            sort=[("nextAttemptAt", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+        if not mail:
+            break
+        batch.append(mail)
+    return batch
+
+
+async def open_smtp_connection() -> aiosmtplib.SMTP:
+    smtp = aiosmtplib.SMTP(hostname=SMTP_HOST, port=SMTP_PORT)
+    await smtp.connect()
+    username = os.getenv("MAILTRAP_SMTP_USER")
+    if username:
+        await smtp.login(username, os.getenv("MAILTRAP_SMTP_PASS"))
+    return smtp
+
+
+async def close_smtp_connection(smtp: aiosmtplib.SMTP | None):
+    if smtp is not None and smtp.is_connected:
+        try:
+            await smtp.quit()
+        except aiosmtplib.SMTPException:
+            smtp.close()
+
+
+async def mark_failed_attempt(db: AsyncIOMotorDatabase, mail: dict, error: Exception):
+    attempts = mail["attempts"] + 1
+    update = {"attempts": attempts, "lastError": str(error)}
+    if attempts >= MAIL_MAX_ATTEMPTS:
+        update["status"] = "failed"
+        print(f"Failed to send email to {mail['to']}: {error}")
+    else:
+        update["status"] = "pending"
+        update["nextAttemptAt"] = datetime.now() + timedelta(
+            seconds=MAIL_RETRY_BASE_SECONDS * 2 ** (attempts - 1)
+        )
+    await db.mailqueue.update_one({"_id": mail["_id"]}, {"$set": update})
+
+
+async def send_batch(db: AsyncIOMotorDatabase, batch: list[dict], smtp):
+    """Send claimed mails over one connection; returns the connection to reuse."""
+    for mail in batch:
+        try:
+            if smtp is None or not smtp.is_connected:
+                smtp = await open_smtp_connection()
+            await smtp.send_message(build_message(mail["to"], mail["subject"], mail["html"]))
+            await db.mailqueue.update_one(
+                {"_id": mail["_id"]},
+                {"$set": {"status": "sent", "sentAt": datetime.now()}},
+            )
+        except Exception as e:
+            await close_smtp_connection(smtp)
+            smtp = None
+            await mark_failed_attempt(db, mail, e)
+    return smtp
+
+
+async def mail_worker(db: AsyncIOMotorDatabase):
+    smtp = None
+    while True:
+        mail_wakeup.clear()
+        try:
+            batch = await claim_batch(db)
+        except Exception as e:
+            print(f"Failed to claim queued emails: {e}")
+            batch = []
+        if not batch:
+            # Drop the idle connection rather than let the server time it out.
+            await close_smtp_connection(smtp)
+            smtp = None
+            try:
+                await asyncio.wait_for(mail_wakeup.wait(), MAIL_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            continue
+
+        try:
+            smtp = await send_batch(db, batch, smtp)
+        except Exception as e:
+            # Recording the outcome failed too (e.g. Mongo is unreachable); keep
+            # the worker alive and let the claim lease hand the mails out again.
+            print(f"Failed to send queued emails: {e}")
+            await close_smtp_connection(smtp)
+            smtp = None
+
+
+def start_mail_dispatcher(db: AsyncIOMotorDatabase):
+    for _ in range(MAIL_WORKERS):
+        mail_workers.append(asyncio.create_task(mail_worker(db)))
+
+
+async def stop_mail_dispatcher():
+    for task in mail_workers:
+        task.cancel()
+    await asyncio.gather(*mail_workers, return_exceptions=True)
+    mail_workers.clear()
 
-    try:
-        with smtplib.SMTP("sandbox.smtp.mailtrap.io", 2525) as server:
-            server.login(os.getenv("MAILTRAP_SMTP_USER"), os.getenv("MAILTRAP_SMTP_PASS"))
-            server.send_message(msg)
-    except Exception as e:
-        print(f"Failed to send email: {e}")
 
 def email_verification_content(username, verification_url):
     template = env.get_template('email_verification.html')
@@ -34,4 +180,4 @@ def email_verification_content(username, verification_url):
 
 def forgot_password_content(username, reset_url):
     template = env.get_template('forgot_password.html')
-    return template.render(username=username, reset_url=reset_url)
\ No newline at end of file
+    return template.render(username=username, reset_url=reset_url)
@@ -0,0 +1,147 @@
+from fastapi import Request, Response
+from fastapi.responses import FileResponse, StreamingResponse
+from pathlib import Path
+import mimetypes
+import anyio
+
+MEDIA_CHUNK_SIZE = 256 * 1024
+# ASGI extension letting the server hand a file descriptor to sendfile(2).
+ZEROCOPY_EXTENSION = "http.response.zerocopysend"
+# Content-addressed files never change under the same URL.
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+def media_etag(path: Path) -> str:
+    # Originals are named <sha256><ext> and variants <sha256>-<size>.webp, so the
+    # stem alone is a strong validator for the bytes on disk.
+    return f'"{path.stem}"'
+
+
+def etag_matches(header: str | None, etag: str) -> bool:
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    candidates = [value.strip().removeprefix("W/") for value in header.split(",")]
+    return etag in candidates
+
+
+def parse_range(header: str, size: int) -> tuple[int, int] | None:
+    """Parse a single byte range; return None to fall back to the full body."""
+    unit, _, ranges = header.partition("=")
+    if unit.strip() != "bytes" or "," in ranges:
+        return None
+    start, _, end = ranges.strip().partition("-")
+    if not start:
+        if not end:
+            raise ValueError("Invalid range")
+        length = int(end)
+        if length == 0:
+            raise ValueError("Unsatisfiable range")
+        return max(size - length, 0), size - 1
+    first = int(start)
+    last = min(int(end), size - 1) if end else size - 1
+    if first >= size or first > last:
+        raise ValueError("Unsatisfiable range")
+    return first, last
+
+
+async def read_file_range(path: Path, start: int, end: int):
+    async with await anyio.open_file(path, "rb") as file:
+        await file.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = await file.read(min(MEDIA_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+class ZeroCopyFileResponse(Response):
+    """Send a byte range of a file with the server's zero-copy extension."""
+
+    def __init__(self, path: Path, offset: int, count: int, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self.offset = offset
+        self.count = count
+
+    async def __call__(self, scope, receive, send):
+        await send(
+            {
+                "type": "http.response.start",
+                "status": self.status_code,
+                "headers": self.raw_headers,
+            }
+        )
+        if scope["method"].upper() != "HEAD":
+            async with await anyio.open_file(self.path, "rb") as file:
+                await send(
+                    {
+                        "type": ZEROCOPY_EXTENSION,
+                        "file": file.wrapped,
+                        "offset": self.offset,
+                        "count": self.count,
+                    }
+                )
+        if self.background is not None:
+            await self.background()
+
+
+def media_response(request: Request, path: Path) -> Response:
+    etag = media_etag(path)
+    headers = {
+        "etag": etag,
+        "cache-control": IMMUTABLE_CACHE_CONTROL,
+        "accept-ranges": "bytes",
+    }
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    stat_result = path.stat()
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (not if_range or if_range.strip() == etag):
+        try:
+            byte_range = parse_range(range_header, stat_result.st_size)
+        except ValueError:
+            return Response(
+                status_code=416,
+                headers={**headers, "content-range": f"bytes */{stat_result.st_size}"},
+            )
+        if byte_range:
+            start, end = byte_range
+            headers["content-range"] = f"bytes {start}-{end}/{stat_result.st_size}"
+            if ZEROCOPY_EXTENSION in request.scope.get("extensions", {}):
+                return zero_copy_response(path, start, end, 206, headers)
+            return StreamingResponse(
+                read_file_range(path, start, end),
+                status_code=206,
+                media_type=media_type(path),
+                headers={**headers, "content-length": str(end - start + 1)},
+            )
+
+    # Servers that advertise zero-copy (uvicorn does not) get the file descriptor;
+    # otherwise FileResponse streams from disk in chunks, and the etag/cache headers
+    # above win over its defaults.
+    if ZEROCOPY_EXTENSION in request.scope.get("extensions", {}):
+        return zero_copy_response(path, 0, stat_result.st_size - 1, 200, headers)
+    return FileResponse(path, headers=headers, stat_result=stat_result)
+
+
+def media_type(path: Path) -> str:
+    return mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+
+
+def zero_copy_response(
+    path: Path, start: int, end: int, status_code: int, headers: dict
+) -> ZeroCopyFileResponse:
+    return ZeroCopyFileResponse(
+        path,
+        offset=start,
+        count=end - start + 1,
+        status_code=status_code,
+        media_type=media_type(path),
+        headers={**headers, "content-length": str(end - start + 1)},
+    )
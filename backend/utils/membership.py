@@ -0,0 +1,68 @@
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from bson import ObjectId
+import os
+from utils.cache import TTLCache
+from utils.presence import user_sids, online_rooms
+
+MEMBERSHIP_CACHE_SIZE = int(os.environ.get("MEMBERSHIP_CACHE_SIZE", 10000))
+MEMBERSHIP_CACHE_TTL_SECONDS = int(os.environ.get("MEMBERSHIP_CACHE_TTL_SECONDS", 300))
+
+# user id -> ids of the chats they belong to, read from their inbox entries.
+# Sockets join every chat room at handshake; writes that change participants
+# update both this index and the rooms of the affected users' sockets.
+chat_memberships = TTLCache(
+    maxsize=MEMBERSHIP_CACHE_SIZE, ttl=MEMBERSHIP_CACHE_TTL_SECONDS
+)
+
+
+async def get_user_chat_ids(db: AsyncIOMotorDatabase, user_id: str) -> set[str]:
+    chat_ids = chat_memberships.get(user_id)
+    if chat_ids is None:
+        chats = await db.inboxes.distinct(
+            "chat", {"user": ObjectId(user_id), "deleted": {"$ne": True}}
+        )
+        chat_ids = {str(chat_id) for chat_id in chats}
+        chat_memberships.set(user_id, chat_ids)
+    return chat_ids
+
+
+async def is_chat_member(db: AsyncIOMotorDatabase, user_id: str, chat_id: str) -> bool:
+    if chat_id in await get_user_chat_ids(db, user_id):
+        return True
+    # A chat created on another worker is not in this worker's cached index yet.
+    chat_memberships.pop(user_id)
+    return chat_id in await get_user_chat_ids(db, user_id)
+
+
+async def join_user_chat_rooms(io, db: AsyncIOMotorDatabase, sid: str, user_id: str):
+    for chat_id in await get_user_chat_ids(db, user_id):
+        await io.enter_room(sid, chat_id)
+
+
+async def add_chat_members(io, chat_id: str, user_ids: list[str]):
+    # enter_room/leave_room only reach sockets on this worker; sockets elsewhere
+    # pick up the change on their next handshake.
+    for user_id in user_ids:
+        chat_ids = chat_memberships.get(user_id)
+        if chat_ids is not None:
+            chat_ids.add(chat_id)
+        for sid in user_sids.get(user_id, ()):
+            await io.enter_room(sid, chat_id)
+
+
+async def remove_chat_members(io, chat_id: str, user_ids: list[str]):
+    for user_id in user_ids:
+        chat_ids = chat_memberships.get(user_id)
+        if chat_ids is not None:
+            chat_ids.discard(chat_id)
+        for sid in user_sids.get(user_id, ()):
+            await io.leave_room(sid, chat_id)
+
+
+def chat_fanout(chat_id: str, sender_id: str, participant_ids: list[str]):
+    """Rooms and skipped sids for an event every participant but the sender gets."""
+    if os.environ.get("SOCKET_MESSAGE_QUEUE"):
+        # Room membership is per worker, so other workers' sockets may not have
+        # joined the chat room yet; address each participant's user room instead.
+        return online_rooms([p for p in participant_ids if p != sender_id]), None
+    return chat_id, list(user_sids.get(sender_id, ()))
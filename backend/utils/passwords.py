@@ -0,0 +1,57 @@
+from concurrent.futures import ThreadPoolExecutor
+from passlib.context import CryptContext
+import asyncio
+import os
+
+# bcrypt releases the GIL, so a small thread pool keeps hashing off the event
+# loop while capping how much CPU a login storm can take from chat traffic.
+PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", 4))
+BCRYPT_ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", 12))
+
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
+
+executor = ThreadPoolExecutor(
+    max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash"
+)
+pending = 0
+
+
+async def run_in_pool(fn, *args):
+    global pending
+    pending += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(executor, fn, *args)
+    finally:
+        pending -= 1
+
+
+def password_pool_stats() -> dict:
+    # Anything above the worker count is waiting in the executor queue.
+    return {
+        "workers": PASSWORD_HASH_WORKERS,
+        "pending": pending,
+        "queued": max(pending - PASSWORD_HASH_WORKERS, 0),
+    }
+
+
+async def get_password_hash(password: str) -> str:
+    return await run_in_pool(pwd_context.hash, password)
+
+
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return await run_in_pool(pwd_context.verify, plain_password, hashed_password)
+
+
+async def verify_and_update_password(
+    plain_password: str, hashed_password: str
+) -> tuple[bool, str | None]:
+    """Verify a password, returning a replacement hash if the cost settings changed."""
+    return await run_in_pool(
+        pwd_context.verify_and_update, plain_password, hashed_password
+    )
@@ -0,0 +1,157 @@
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateOne
+from bson import ObjectId
+from datetime import datetime
+from models.chat import ChatEventType
+import asyncio
+import os
+import time
+
+PRESENCE_TTL_SECONDS = float(os.environ.get("PRESENCE_TTL_SECONDS", 90))
+PRESENCE_FLUSH_SECONDS = float(os.environ.get("PRESENCE_FLUSH_SECONDS", 2))
+
+# Sockets connected to this process. With SOCKET_MESSAGE_QUEUE set other workers
+# hold sockets too, so "offline here" does not mean offline: fan-out is not
+# filtered, presence events are not published and queries report online as
+# unknown. lastSeen is still recorded when a socket closes.
+user_sids: dict[str, set[str]] = {}
+sid_users: dict[str, str] = {}
+sid_heartbeats: dict[str, float] = {}
+# Users whose online state changed since the last flush -> last seen (None if online).
+presence_changes: dict[str, datetime | None] = {}
+presence_tracker: asyncio.Task | None = None
+
+
+def register_sid(sid: str, user_id: str):
+    sid_users[sid] = user_id
+    sid_heartbeats[sid] = time.monotonic()
+    sids = user_sids.setdefault(user_id, set())
+    if not sids:
+        presence_changes[user_id] = None
+    sids.add(sid)
+
+
+def unregister_sid(sid: str):
+    user_id = sid_users.pop(sid, None)
+    sid_heartbeats.pop(sid, None)
+    if user_id is None:
+        return
+    sids = user_sids.get(user_id, set())
+    sids.discard(sid)
+    if not sids:
+        user_sids.pop(user_id, None)
+        presence_changes[user_id] = datetime.now()
+
+
+def heartbeat(sid: str):
+    if sid in sid_users:
+        sid_heartbeats[sid] = time.monotonic()
+
+
+def expire_sids() -> list[str]:
+    """Unregister sids that stopped sending heartbeats and return them."""
+    cutoff = time.monotonic() - PRESENCE_TTL_SECONDS
+    expired = [sid for sid, seen_at in sid_heartbeats.items() if seen_at < cutoff]
+    for sid in expired:
+        unregister_sid(sid)
+    return expired
+
+
+def is_online(user_id: str) -> bool:
+    return bool(user_sids.get(str(user_id)))
+
+
+def online_rooms(user_ids: list[str]) -> list[str]:
+    """Drop user rooms without live sockets, when this process sees every socket."""
+    if os.environ.get("SOCKET_MESSAGE_QUEUE"):
+        return user_ids
+    return [user_id for user_id in user_ids if is_online(user_id)]
+
+
+async def get_presence(
+    db: AsyncIOMotorDatabase, viewer_id: ObjectId, user_ids: list[ObjectId]
+) -> list[dict]:
+    """Presence of the given users that share a chat with the viewer; others are left out."""
+    contacts = await db.chats.distinct(
+        "participants",
+        {"$and": [{"participants": viewer_id}, {"participants": {"$in": user_ids}}]},
+    )
+    visible = [user_id for user_id in user_ids if user_id in contacts]
+    users = await db.users.find({"_id": {"$in": visible}}, {"lastSeen": 1}).to_list(None)
+    # Other workers' sockets are not visible here, so online can not be known.
+    shared = bool(os.environ.get("SOCKET_MESSAGE_QUEUE"))
+    return [
+        {
+            "userId": user["_id"],
+            "online": None if shared else is_online(user["_id"]),
+            # Not yet flushed to Mongo if the user went offline moments ago.
+            "lastSeen": presence_changes.get(str(user["_id"])) or user.get("lastSeen"),
+        }
+        for user in users
+    ]
+
+
+async def flush_presence(db: AsyncIOMotorDatabase, io):
+    # A socket that is still open but silent would otherwise stay connected while
+    # reported offline, with later heartbeats ignored; close it so the client
+    # reconnects and registers again.
+    for sid in expire_sids():
+        await io.disconnect(sid)
+    if not presence_changes:
+        return
+    changes = dict(presence_changes)
+    presence_changes.clear()
+
+    offline = [
+        UpdateOne({"_id": ObjectId(user_id)}, {"$set": {"lastSeen": last_seen}})
+        for user_id, last_seen in changes.items()
+        if last_seen is not None
+    ]
+    if offline:
+        await db.users.bulk_write(offline, ordered=False)
+    if os.environ.get("SOCKET_MESSAGE_QUEUE"):
+        return
+
+    # One event per contact carrying every change among the people they chat with.
+    changed_ids = [ObjectId(user_id) for user_id in changes]
+    contact_changes: dict[str, dict[str, dict]] = {}
+    async for chat in db.chats.find(
+        {"participants": {"$in": changed_ids}}, {"participants": 1}
+    ):
+        participants = [str(p) for p in chat["participants"]]
+        for user_id in participants:
+            if user_id not in changes:
+                continue
+            update = {
+                "userId": user_id,
+                "online": changes[user_id] is None,
+                "lastSeen": changes[user_id].isoformat() if changes[user_id] else None,
+            }
+            for contact in online_rooms(participants):
+                if contact != user_id:
+                    contact_changes.setdefault(contact, {})[user_id] = update
+
+    for contact, updates in contact_changes.items():
+        await io.emit(ChatEventType.PRESENCE_EVENT, list(updates.values()), room=contact)
+
+
+async def presence_loop(db: AsyncIOMotorDatabase, io):
+    while True:
+        await asyncio.sleep(PRESENCE_FLUSH_SECONDS)
+        try:
+            await flush_presence(db, io)
+        except Exception as e:
+            print(f"Failed to flush presence changes: {e}")
+
+
+def start_presence_tracker(db: AsyncIOMotorDatabase, io):
+    global presence_tracker
+    presence_tracker = asyncio.create_task(presence_loop(db, io))
+
+
+async def stop_presence_tracker():
+    global presence_tracker
+    if presence_tracker is not None:
+        presence_tracker.cancel()
+        await asyncio.gather(presence_tracker, return_exceptions=True)
+        presence_tracker = None
@@ -0,0 +1,45 @@
+from fastapi.responses import ORJSONResponse
+from bson import ObjectId
+import orjson
+import os
+
+# Opt-in: hot read endpoints skip Pydantic validation of every document and hand
+# the Mongo documents straight to orjson. Field names already match the response
+# models; optional fields missing from a document are omitted instead of null.
+FAST_JSON = os.environ.get("FAST_JSON", "false").lower() in ("1", "true", "yes")
+
+
+def bson_default(value):
+    # orjson handles datetime natively (same ISO format Pydantic emits for the
+    # naive datetimes Mongo returns); ObjectId is the only BSON type left over.
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(content) -> bytes:
+    return orjson.dumps(content, default=bson_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+class BSONJSONResponse(ORJSONResponse):
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+def fast_response(response_model, **content):
+    """Build the response model, or with FAST_JSON serialize the raw documents directly."""
+    if FAST_JSON:
+        return BSONJSONResponse(content)
+    return response_model(**content)
+
+
+class orjson_module:
+    """Drop-in for the json module python-socketio encodes packets with."""
+
+    @staticmethod
+    def dumps(obj, *args, **kwargs) -> str:
+        return dumps(obj).decode()
+
+    @staticmethod
+    def loads(s, *args, **kwargs):
+        return orjson.loads(s)
@@ -1,19 +1,132 @@
 import socketio
 from models.auth import UserInDB
-from jose import jwt
 from utils.dbUtils import get_client
+from bson import ObjectId
 import os
-from models.chat import ChatEventType
+from models.chat import ChatEventType, SendMessagePayload, MarkReadPayload, JoinChatPayload
+from utils.user_cache import get_user_profile
+from utils.token_cache import decode_access_token, is_expired, is_revoked, revoke_user_tokens
+from utils.serialization import orjson_module
+from utils.typing_indicators import mark_typing, mark_stopped_typing, forget_typing_sid
+from utils.presence import register_sid, unregister_sid, heartbeat
+from utils.membership import join_user_chat_rooms, is_chat_member
+from utils.delivery import record_delivery, missed_deliveries
 
 sio : socketio.AsyncServer | None = None
 
+# Published over the message queue so every worker rejects a user's revoked
+# tokens; the client manager consumes it before it could reach any socket.
+TOKEN_REVOCATION_EVENT = "tokenRevocation"
+
+
+class TokenRevocationRelay:
+    """Client manager mixin applying token revocations sent by any worker."""
+
+    async def _handle_emit(self, message):
+        if message["event"] == TOKEN_REVOCATION_EVENT:
+            revoke_user_tokens(message["data"]["userId"], message["data"]["revokedAt"])
+            return
+        await super()._handle_emit(message)
+
+
+class RedisManager(TokenRevocationRelay, socketio.AsyncRedisManager):
+    pass
+
+
+class AioPikaManager(TokenRevocationRelay, socketio.AsyncAioPikaManager):
+    pass
+
+
+def get_client_manager():
+    # Without a message queue every worker only reaches its own sockets, so
+    # multi-worker deployments must point SOCKET_MESSAGE_QUEUE at a shared broker.
+    url = os.environ.get("SOCKET_MESSAGE_QUEUE")
+    if not url:
+        return None
+    channel = os.environ.get("SOCKET_CHANNEL", "socketio")
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisManager(url, channel=channel)
+    if url.startswith(("amqp://", "amqps://")):
+        return AioPikaManager(url, channel=channel)
+    raise ValueError(f"Unsupported socket message queue: {url}")
+
+
+def get_serializer_options():
+    # msgpack is a binary packet format; clients must connect with a matching
+    # parser (socket.io-msgpack-parser), so it is a deployment-wide choice.
+    serializer = os.environ.get("SOCKET_SERIALIZER", "json")
+    if serializer == "msgpack":
+        return {"serializer": "msgpack"}
+    if serializer == "json":
+        return {"json": orjson_module}
+    raise ValueError(f"Unsupported socket serializer: {serializer}")
+
+
 def get_socketio():
     global sio
     if not sio:
-        sio = socketio.AsyncServer(async_mode='asgi', cors_allowed_origins=[])
+        sio = socketio.AsyncServer(
+            async_mode='asgi',
+            cors_allowed_origins=[],
+            client_manager=get_client_manager(),
+            **get_serializer_options(),
+        )
     return sio
 
+def start_client_manager(io: socketio.AsyncServer):
+    # Managers otherwise start listening on the first socket connection; start now
+    # so a worker without sockets still receives token revocations.
+    if not io.manager_initialized:
+        io.manager_initialized = True
+        io.manager.initialize()
+
+
+async def revoke_tokens_everywhere(io: socketio.AsyncServer, user_id: str):
+    """Revoke the user's tokens here and, over the message queue, in every worker."""
+    revoked_at = revoke_user_tokens(user_id)
+    if isinstance(io.manager, TokenRevocationRelay):
+        await io.emit(
+            TOKEN_REVOCATION_EVENT, {"userId": str(user_id), "revokedAt": revoked_at}
+        )
+
 def create_socket_events(sio: socketio.AsyncServer):
+    from fastapi import HTTPException
+    from bson.errors import InvalidId
+    from pydantic import ValidationError
+    from utils.chat import mark_chat_as_read, send_message_to_chat
+
+    async def reject(sid, detail):
+        """Report a failed event to the socket and build the matching ack."""
+        await sio.emit(ChatEventType.SOCKET_ERROR_EVENT, detail, room=sid)
+        return {"success": False, "message": detail}
+
+    def payload_error(error: ValidationError) -> str:
+        fields = "; ".join(
+            f"{'.'.join(str(loc) for loc in e['loc']) or 'payload'}: {e['msg']}"
+            for e in error.errors()
+        )
+        return f"Invalid payload. {fields}"
+
+    async def run_for_session(sid, handler, *args):
+        """Run a shared chat handler as the socket's user and shape the ack."""
+        session = await sio.get_session(sid)
+        if not session.get("user"):
+            return {"success": False, "message": "Un-authorized socket"}
+        # The claims were checked at handshake only; the token may have expired
+        # or been revoked since, while the socket stayed open.
+        if is_expired(session["user"]) or is_revoked(session["user"]):
+            ack = await reject(sid, "Session expired. Please reconnect")
+            await sio.disconnect(sid)
+            return ack
+        try:
+            response = await handler(session["user"], *args)
+        except (HTTPException, InvalidId) as e:
+            return await reject(sid, getattr(e, "detail", str(e)))
+        return {
+            "success": True,
+            "data": response.data.model_dump(mode="json", by_alias=True),
+        }
+
     @sio.event
     async def connect(sid, environ, auth):
         try:
@@ -22,15 +135,27 @@ def create_socket_events(sio: socketio.AsyncServer):
             if not token:
                 raise ValueError("Un-authorized handshake. Token is missing")
 
-            decoded_token = jwt.decode(token, os.environ.get("ACCESS_TOKEN_SECRET"), algorithms=["HS256"])
+            decoded_token = decode_access_token(token)
             user_id = decoded_token.get('_id')
 
-            user = await db.users.find_one({"_id": user_id})
+            user = await get_user_profile(db, ObjectId(user_id))
             if not user:
                 raise ValueError("Un-authorized handshake. Token is invalid")
 
-            sio.enter_room(sid, user_id)
+            await sio.save_session(sid, {"user": decoded_token})
+            await sio.enter_room(sid, user_id)
+            register_sid(sid, user_id)
+            await join_user_chat_rooms(sio, db, sid, user_id)
             await sio.emit(ChatEventType.CONNECTED_EVENT, room=user_id)
+
+            last_seq = auth.get("lastSeq")
+            if not isinstance(last_seq, int) or last_seq < 0:
+                last_seq = None
+            await sio.emit(
+                ChatEventType.REPLAY_EVENT,
+                await missed_deliveries(db, user_id, last_seq),
+                room=sid,
+            )
             print(f"User connected. userId: {user_id}")
 
             # You can call your other event handlers here
@@ -39,26 +164,107 @@ def create_socket_events(sio: socketio.AsyncServer):
 
 
     @sio.on(ChatEventType.JOIN_CHAT_EVENT)
-    async def join_chat(sid, chat_id):
-        print(f"User joined the chat. chatId: {chat_id}")
-        sio.enter_room(sid, chat_id)
+    async def join_chat(sid, data):
+        # Sockets already join their chats at handshake; this only covers chats
+        # created on another worker since, and never rooms of other users' chats.
+        try:
+            payload = JoinChatPayload.model_validate(data)
+        except ValidationError as e:
+            return await reject(sid, payload_error(e))
+        session = await sio.get_session(sid)
+        if not session.get("user"):
+            return
+        if await is_chat_member(get_client(), session["user"]["_id"], payload.chatId):
+            print(f"User joined the chat. chatId: {payload.chatId}")
+            await sio.enter_room(sid, payload.chatId)
 
 
     @sio.on(ChatEventType.TYPING_EVENT)
     async def participant_typing(sid, chat_id):
-        await sio.emit(ChatEventType.TYPING_EVENT, chat_id, room=chat_id)
+        session = await sio.get_session(sid)
+        if session.get("user") and chat_id:
+            mark_typing(chat_id, session["user"]["_id"], sid)
 
 
     @sio.on(ChatEventType.STOP_TYPING_EVENT)
     async def participant_stopped_typing(sid, chat_id):
-        await sio.emit(ChatEventType.STOP_TYPING_EVENT, chat_id, room=chat_id)
+        session = await sio.get_session(sid)
+        if session.get("user") and chat_id:
+            mark_stopped_typing(chat_id, session["user"]["_id"])
+
+
+    @sio.on(ChatEventType.HEARTBEAT_EVENT)
+    async def socket_heartbeat(sid):
+        heartbeat(sid)
+
+
+    @sio.on(ChatEventType.MARK_READ_EVENT)
+    async def mark_read(sid, data):
+        try:
+            payload = MarkReadPayload.model_validate(data)
+        except ValidationError as e:
+            return await reject(sid, payload_error(e))
+        return await run_for_session(
+            sid, mark_chat_as_read, payload.chatId, payload.messageId, get_client(), sio
+        )
+
+
+    @sio.on(ChatEventType.SEND_MESSAGE_EVENT)
+    async def send_message(sid, data):
+        # Validated before anything is persisted; non-dict data or a non-string
+        # content never reaches send_message_to_chat.
+        try:
+            payload = SendMessagePayload.model_validate(data)
+        except ValidationError as e:
+            return await reject(sid, payload_error(e))
+        return await run_for_session(
+            sid,
+            send_message_to_chat,
+            payload.chatId,
+            payload.content,
+            [],
+            get_client(),
+            sio,
+            None,
+            payload.clientMessageId,
+        )
 
 
     @sio.on(ChatEventType.DISCONNECT_EVENT)
     async def disconnect(sid):
         print(f"User has disconnected. userId: {sid}")
+        forget_typing_sid(sid)
+        unregister_sid(sid)
         # Here, you need to handle disconnection and room leaving logic
 
 
-async def emit_socket_event(io, room_id, event, payload):
-    await io.emit(event, payload, room=room_id)
+async def emit_socket_event(io, room_id, event, payload, skip_sid=None):
+    # room_id may be a list: the packet is encoded once and sent to every room,
+    # instead of once per participant.
+    await io.emit(event, payload, room=room_id, skip_sid=skip_sid)
+
+
+async def emit_logged_socket_event(io, db, user_ids, event, payload):
+    """Emit to user rooms after recording the event for replay on reconnect."""
+    payload = await record_delivery(db, user_ids, event, payload)
+    await emit_socket_event(io, user_ids, event, payload)
+
+
+# Strong references to in-flight fan-out tasks so they are not garbage collected.
+background_emits: set = set()
+
+
+def dispatch_socket_event(io, room_ids, event, payload, skip_sid=None):
+    """Emit to one or many rooms in a single call without blocking the caller."""
+    if not room_ids:
+        return
+
+    async def _emit():
+        try:
+            await emit_socket_event(io, room_ids, event, payload, skip_sid)
+        except Exception as e:
+            print(f"Failed to emit {event}: {e}")
+
+    task = io.start_background_task(_emit)
+    background_emits.add(task)
+    task.add_done_callback(background_emits.discard)
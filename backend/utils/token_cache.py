@@ -0,0 +1,60 @@
+from jose import JWTError, jwt
+import hashlib
+import os
+import time
+from utils.cache import TTLCache
+
+ACCESS_TOKEN_SECRET = os.environ.get("ACCESS_TOKEN_SECRET")
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.environ.get("ACCESS_TOKEN_EXPIRE_MINUTES", 15))
+ALGORITHM = "HS256"
+TOKEN_CACHE_SIZE = int(os.environ.get("TOKEN_CACHE_SIZE", 10000))
+
+# Decoded claims keyed by the sha256 of the raw token, kept until the token's own
+# exp so a cache hit never accepts a token jwt.decode would reject as expired.
+verified_tokens = TTLCache(
+    maxsize=TOKEN_CACHE_SIZE, ttl=ACCESS_TOKEN_EXPIRE_MINUTES * 60
+)
+# user id -> time of the last logout/password change. Tokens issued before it are
+# rejected; entries only need to outlive the longest-lived access token.
+revocations = TTLCache(maxsize=TOKEN_CACHE_SIZE, ttl=ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+
+
+def token_digest(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def is_revoked(claims: dict) -> bool:
+    revoked_at = revocations.get(claims.get("_id"))
+    return revoked_at is not None and claims.get("iat", 0) <= revoked_at
+
+
+def is_expired(claims: dict) -> bool:
+    return "exp" in claims and claims["exp"] <= time.time()
+
+
+def decode_access_token(token: str) -> dict:
+    """Verify an access token, reusing previously verified claims. Raises JWTError."""
+    key = token_digest(token)
+    claims = verified_tokens.get(key)
+    if claims is None:
+        claims = jwt.decode(token, ACCESS_TOKEN_SECRET, algorithms=[ALGORITHM])
+        expires_in = claims["exp"] - time.time() if "exp" in claims else None
+        verified_tokens.set(key, claims, ttl=expires_in)
+    if is_revoked(claims):
+        verified_tokens.pop(key)
+        raise JWTError("Token has been revoked")
+    return claims
+
+
+def revoke_user_tokens(user_id: str, revoked_at: float | None = None) -> float:
+    """Reject the user's access tokens issued until revoked_at (default now), in this process."""
+    if revoked_at is None:
+        revoked_at = time.time()
+    current = revocations.get(str(user_id))
+    if current is None or current < revoked_at:
+        revocations.set(str(user_id), revoked_at)
+    return revoked_at
+
+
+def token_cache_stats() -> dict:
+    return verified_tokens.stats()
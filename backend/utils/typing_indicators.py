@@ -0,0 +1,118 @@
+from models.chat import ChatEventType
+import asyncio
+import os
+import time
+import uuid
+
+TYPING_FLUSH_SECONDS = float(os.environ.get("TYPING_FLUSH_SECONDS", 1))
+TYPING_EXPIRY_SECONDS = float(os.environ.get("TYPING_EXPIRY_SECONDS", 6))
+
+# Typing events only update this state; a flush loop sends at most one "who is
+# typing" snapshot per chat per interval, and only for chats whose typers changed.
+# chat id -> user id -> {"expiresAt": float, "sids": set}
+typers: dict[str, dict[str, dict]] = {}
+dirty_chats: set[str] = set()
+typing_counters = {"received": 0, "suppressed": 0, "emitted": 0}
+# Each process only knows the typers on its own sockets. With SOCKET_MESSAGE_QUEUE
+# set, snapshots carry this origin and clients merge the latest one per origin,
+# so an empty snapshot from one worker does not clear typers held by another.
+TYPING_ORIGIN = uuid.uuid4().hex
+typing_flusher: asyncio.Task | None = None
+
+
+def mark_typing(chat_id: str, user_id: str, sid: str):
+    typing_counters["received"] += 1
+    chat_typers = typers.setdefault(chat_id, {})
+    typer = chat_typers.get(user_id)
+    if typer is None:
+        chat_typers[user_id] = {
+            "expiresAt": time.monotonic() + TYPING_EXPIRY_SECONDS,
+            "sids": {sid},
+        }
+        dirty_chats.add(chat_id)
+        return
+    # Repeated typing events only keep the user from expiring.
+    typer["expiresAt"] = time.monotonic() + TYPING_EXPIRY_SECONDS
+    typer["sids"].add(sid)
+    typing_counters["suppressed"] += 1
+
+
+def mark_stopped_typing(chat_id: str, user_id: str):
+    typing_counters["received"] += 1
+    chat_typers = typers.get(chat_id)
+    if not chat_typers or chat_typers.pop(user_id, None) is None:
+        typing_counters["suppressed"] += 1
+        return
+    if not chat_typers:
+        del typers[chat_id]
+    dirty_chats.add(chat_id)
+
+
+def forget_typing_sid(sid: str):
+    """Drop a disconnected socket; users left with no typing sockets stop typing."""
+    for chat_id, chat_typers in list(typers.items()):
+        for user_id, typer in list(chat_typers.items()):
+            typer["sids"].discard(sid)
+            if not typer["sids"]:
+                del chat_typers[user_id]
+                dirty_chats.add(chat_id)
+        if not chat_typers:
+            del typers[chat_id]
+
+
+def expire_typers():
+    now = time.monotonic()
+    for chat_id, chat_typers in list(typers.items()):
+        for user_id, typer in list(chat_typers.items()):
+            if typer["expiresAt"] <= now:
+                del chat_typers[user_id]
+                dirty_chats.add(chat_id)
+        if not chat_typers:
+            del typers[chat_id]
+
+
+async def flush_typing(io):
+    expire_typers()
+    chat_ids = list(dirty_chats)
+    dirty_chats.clear()
+    for chat_id in chat_ids:
+        chat_typers = typers.get(chat_id, {})
+        # A lone typer has nobody else to see; skip their own sockets.
+        skip_sids = (
+            list(next(iter(chat_typers.values()))["sids"])
+            if len(chat_typers) == 1
+            else None
+        )
+        await io.emit(
+            ChatEventType.TYPING_USERS_EVENT,
+            {"chatId": chat_id, "users": list(chat_typers), "origin": TYPING_ORIGIN},
+            room=chat_id,
+            skip_sid=skip_sids,
+        )
+        typing_counters["emitted"] += 1
+
+
+async def typing_loop(io):
+    while True:
+        await asyncio.sleep(TYPING_FLUSH_SECONDS)
+        try:
+            await flush_typing(io)
+        except Exception as e:
+            print(f"Failed to flush typing snapshots: {e}")
+
+
+def start_typing_flusher(io):
+    global typing_flusher
+    typing_flusher = asyncio.create_task(typing_loop(io))
+
+
+async def stop_typing_flusher():
+    global typing_flusher
+    if typing_flusher is not None:
+        typing_flusher.cancel()
+        await asyncio.gather(typing_flusher, return_exceptions=True)
+        typing_flusher = None
+
+
+def typing_stats() -> dict:
+    return {**typing_counters, "activeChats": len(typers)}
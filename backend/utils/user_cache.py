@@ -0,0 +1,89 @@
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from bson import ObjectId
+import os
+from utils.cache import TTLCache
+
+USER_CACHE_SIZE = int(os.environ.get("USER_CACHE_SIZE", 10000))
+USER_CACHE_TTL_SECONDS = int(os.environ.get("USER_CACHE_TTL_SECONDS", 300))
+
+# Public profile fields only; secrets never enter the cache.
+USER_PROFILE_PROJECTION = {
+    "password": 0,
+    "refreshToken": 0,
+    "forgotPasswordToken": 0,
+    "forgotPasswordExpiry": 0,
+    "emailVerificationToken": 0,
+    "emailVerificationExpiry": 0,
+}
+
+# Profiles used to hydrate senders and participants in Python instead of joining
+# users into every chat and message read with $lookup.
+user_profiles = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL_SECONDS)
+
+
+def user_summary(profile: dict) -> dict:
+    return {
+        "_id": profile["_id"],
+        "username": profile["username"],
+        "email": profile["email"],
+        "avatar": profile["avatar"],
+    }
+
+
+async def get_user_profiles(
+    db: AsyncIOMotorDatabase, user_ids: list[ObjectId]
+) -> dict[ObjectId, dict]:
+    profiles = {}
+    missing = []
+    for user_id in set(user_ids):
+        profile = user_profiles.get(user_id)
+        if profile is None:
+            missing.append(user_id)
+        else:
+            profiles[user_id] = profile
+    if missing:
+        async for profile in db.users.find({"_id": {"$in": missing}}, USER_PROFILE_PROJECTION):
+            user_profiles.set(profile["_id"], profile)
+            profiles[profile["_id"]] = profile
+    return profiles
+
+
+async def get_user_profile(db: AsyncIOMotorDatabase, user_id: ObjectId) -> dict | None:
+    profiles = await get_user_profiles(db, [user_id])
+    return profiles.get(user_id)
+
+
+def invalidate_user_profile(user_id: ObjectId | str):
+    user_profiles.pop(ObjectId(user_id))
+
+
+async def hydrate_messages(db: AsyncIOMotorDatabase, messages: list[dict]) -> list[dict]:
+    """Replace each message's sender id with the sender's summary."""
+    profiles = await get_user_profiles(db, [message["sender"] for message in messages])
+    for message in messages:
+        profile = profiles.get(message["sender"])
+        message["sender"] = user_summary(profile) if profile else None
+    return messages
+
+
+async def hydrate_chat(db: AsyncIOMotorDatabase, chat: dict) -> dict:
+    """Replace participant ids and the lastMessage id with their documents."""
+    last_message = None
+    if chat.get("lastMessage"):
+        last_message = await db.chatmessages.find_one({"_id": chat["lastMessage"]})
+
+    user_ids = list(chat["participants"])
+    if last_message:
+        user_ids.append(last_message["sender"])
+    profiles = await get_user_profiles(db, user_ids)
+
+    chat["participants"] = [
+        dict(profiles[participant])
+        for participant in chat["participants"]
+        if participant in profiles
+    ]
+    if last_message:
+        sender = profiles.get(last_message["sender"])
+        last_message["sender"] = user_summary(sender) if sender else None
+    chat["lastMessage"] = last_message
+    return chat
@@ -40,14 +40,20 @@ const logoutUser = () => {
   return apiClient.post("/users/logout");
 };
 
-const getAvailableUsers = () => {
-  return apiClient.get("/chat-app/chats/users");
+const getAvailableUsers = (q?: string, cursor?: string) => {
+  return apiClient.get("/chat-app/chats/users", { params: { q, cursor } });
 };
 
 const getUserChats = () => {
   return apiClient.get(`/chat-app/chats`);
 };
 
+// Chats created, updated or removed since the version returned by a previous call;
+// changes close to that version can be returned again and should be merged by _id
+const getChatChanges = (since: number) => {
+  return apiClient.get(`/chat-app/chats/changes`, { params: { since } });
+};
+
 const createUserChat = (receiverId: string) => {
   return apiClient.post(`/chat-app/chats/c/${receiverId}`);
 };
@@ -80,8 +86,9 @@ const removeParticipantFromGroup = (chatId: string, participantId: string) => {
   return apiClient.delete(`/chat-app/chats/group/${chatId}/${participantId}`);
 };
 
-const getChatMessages = (chatId: string) => {
-  return apiClient.get(`/chat-app/messages/${chatId}`);
+// Newest messages first; pass the previous page's nextCursor as `before` for older ones
+const getChatMessages = (chatId: string, before?: string) => {
+  return apiClient.get(`/chat-app/messages/${chatId}`, { params: { before } });
 };
 
 const sendMessage = (chatId: string, content: string, attachments: File[]) => {
@@ -99,6 +106,14 @@ const deleteMessage = (chatId: string, messageId: string) => {
   return apiClient.delete(`/chat-app/messages/${chatId}/${messageId}`);
 };
 
+const getPresence = (userIds: string[]) => {
+  // Sent as repeated userIds params, which is what the server expects for lists
+  return apiClient.get("/chat-app/presence", {
+    params: { userIds },
+    paramsSerializer: { indexes: null },
+  });
+};
+
 // Export all the API functions
 export {
   addParticipantToGroup,
@@ -107,8 +122,10 @@ export {
   deleteGroup,
   deleteOneOnOneChat,
   getAvailableUsers,
+  getChatChanges,
   getChatMessages,
   getGroupInfo,
+  getPresence,
   getUserChats,
   loginUser,
   logoutUser,
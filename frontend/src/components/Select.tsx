@@ -11,7 +11,12 @@ const Select: React.FC<{
   value: string;
   onChange: (value: { value: string; label: string }) => void;
   placeholder: string;
-}> = ({ options, value, placeholder, onChange }) => {
+  // Called with the typed text, for options that are searched on the server
+  onSearch?: (query: string) => void;
+  // Shows a "Load more" entry below the options while more can be fetched
+  hasMore?: boolean;
+  onLoadMore?: () => void;
+}> = ({ options, value, placeholder, onChange, onSearch, hasMore, onLoadMore }) => {
   const [localOptions, setLocalOptions] = useState<typeof options>([]);
 
   useEffect(() => {
@@ -34,6 +39,7 @@ const Select: React.FC<{
               setLocalOptions(
                 options.filter((op) => op.label.includes(e.target.value))
               );
+              onSearch && onSearch(e.target.value);
             }}
             displayValue={(option: (typeof options)[0]) => option?.label}
           />
@@ -83,6 +89,17 @@ const Select: React.FC<{
                 )}
               </Combobox.Option>
             ))}
+            {hasMore && onLoadMore ? (
+              <button
+                type="button"
+                // Keep focus in the input so the options stay open
+                onMouseDown={(e) => e.preventDefault()}
+                onClick={onLoadMore}
+                className="w-full rounded-2xl py-4 pl-3 text-left text-zinc-400 hover:bg-dark hover:text-white"
+              >
+                Load more
+              </button>
+            ) : null}
           </Combobox.Options>
         )}
       </div>
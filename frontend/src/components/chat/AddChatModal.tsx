@@ -4,9 +4,10 @@ import {
   XCircleIcon,
   XMarkIcon,
 } from "@heroicons/react/20/solid";
-import { Fragment, useEffect, useState } from "react";
-import { createGroupChat, createUserChat, getAvailableUsers } from "../../api";
+import { Fragment, useState } from "react";
+import { createGroupChat, createUserChat } from "../../api";
 import { ChatListItemInterface } from "../../interfaces/chat";
+import useAvailableUsers from "../../hooks/useAvailableUsers";
 import { UserInterface } from "../../interfaces/user";
 import { classNames, requestHandler } from "../../utils";
 import Button from "../Button";
@@ -18,35 +19,24 @@ const AddChatModal: React.FC<{
   onClose: () => void;
   onSuccess: (chat: ChatListItemInterface) => void;
 }> = ({ open, onClose, onSuccess }) => {
-  // State to store the list of users, initialized as an empty array
-  const [users, setUsers] = useState<UserInterface[]>([]);
+  // Users matching the search, fetched a page at a time while the modal is open
+  const { users, searchUsers, hasMoreUsers, loadMoreUsers, resetUsers } =
+    useAvailableUsers(open);
   // State to store the name of a group, initialized as an empty string
   const [groupName, setGroupName] = useState("");
   // State to determine if the chat is a group chat, initialized as false
   const [isGroupChat, setIsGroupChat] = useState(false);
   // State to store the list of participants in a group chat, initialized as an empty array
   const [groupParticipants, setGroupParticipants] = useState<string[]>([]);
+  // Selected participants by ID, kept since a later search replaces the users list
+  const [participantDetails, setParticipantDetails] = useState<
+    Record<string, UserInterface>
+  >({});
   // State to store the ID of a selected user, initialized as null
   const [selectedUserId, setSelectedUserId] = useState<null | string>(null);
   // State to determine if a chat is currently being created, initialized as false
   const [creatingChat, setCreatingChat] = useState(false);
 
-  // Function to fetch users
-  const getUsers = async () => {
-    // Handle the request to get available users
-    requestHandler(
-      // Callback to fetch available users
-      async () => await getAvailableUsers(),
-      null, // No loading setter callback provided
-      // Success callback
-      (res) => {
-        const { data } = res; // Extract data from response
-        setUsers(data || []); // Set users data or an empty array if data is absent
-      },
-      alert // Use the alert as the error handler
-    );
-  };
-
   // Function to create a new chat with a user
   const createNewChat = async () => {
     // If no user is selected, show an alert
@@ -101,29 +91,21 @@ const AddChatModal: React.FC<{
 
   // Function to reset local state values and close the modal/dialog
   const handleClose = () => {
-    // Clear the list of users
-    setUsers([]);
+    // Clear the list of users and the search
+    resetUsers();
     // Reset the selected user ID
     setSelectedUserId("");
     // Clear the group name
     setGroupName("");
     // Clear the group participants list
     setGroupParticipants([]);
+    setParticipantDetails({});
     // Set the chat type to not be a group chat
     setIsGroupChat(false);
     // Execute the onClose callback/function
     onClose();
   };
 
-  // useEffect hook to perform side effects based on changes in the component lifecycle or state/props
-  useEffect(() => {
-    // Check if the modal/dialog is not open
-    if (!open) return;
-    // Fetch users if the modal/dialog is open
-    getUsers();
-    // The effect depends on the 'open' value. Whenever 'open' changes, the effect will re-run.
-  }, [open]);
-
   return (
     <Transition.Root show={open} as={Fragment}>
       <Dialog as="div" className="relative z-10" onClose={handleClose}>
@@ -230,10 +212,19 @@ const AddChatModal: React.FC<{
                           value: user._id,
                         };
                       })}
+                      onSearch={searchUsers}
+                      hasMore={hasMoreUsers}
+                      onLoadMore={loadMoreUsers}
                       onChange={({ value }) => {
                         if (isGroupChat && !groupParticipants.includes(value)) {
                           // if user is creating a group chat track the participants in an array
                           setGroupParticipants([...groupParticipants, value]);
+                          const participant = users.find((u) => u._id === value);
+                          if (participant)
+                            setParticipantDetails({
+                              ...participantDetails,
+                              [value]: participant,
+                            });
                         } else {
                           setSelectedUserId(value);
                           // if user is creating normal chat just get a single user
@@ -252,11 +243,10 @@ const AddChatModal: React.FC<{
                         participants
                       </span>{" "}
                       <div className="flex justify-start items-center flex-wrap gap-2 mt-3">
-                        {users
-                          .filter((user) =>
-                            groupParticipants.includes(user._id)
-                          )
-                          ?.map((participant) => {
+                        {groupParticipants
+                          .filter((id) => participantDetails[id])
+                          .map((id) => participantDetails[id])
+                          .map((participant) => {
                             return (
                               <div
                                 className="inline-flex bg-secondary rounded-full p-2 border-[1px] border-zinc-400 items-center gap-2"
@@ -10,14 +10,13 @@ import React, { Fragment, useEffect, useState } from "react";
 import {
   addParticipantToGroup,
   deleteGroup,
-  getAvailableUsers,
   getGroupInfo,
   removeParticipantFromGroup,
   updateGroupName,
 } from "../../api";
 import { useAuth } from "../../context/AuthContext";
+import useAvailableUsers from "../../hooks/useAvailableUsers";
 import { ChatListItemInterface } from "../../interfaces/chat";
-import { UserInterface } from "../../interfaces/user";
 import { requestHandler } from "../../utils";
 import Button from "../Button";
 import Input from "../Input";
@@ -44,8 +43,9 @@ const GroupChatDetailsModal: React.FC<{
   const [groupDetails, setGroupDetails] =
     useState<ChatListItemInterface | null>(null);
 
-  // State to manage a list of users, initially set as an empty array
-  const [users, setUsers] = useState<UserInterface[]>([]);
+  // Users matching the search, fetched a page at a time while the modal is open
+  const { users, searchUsers, hasMoreUsers, loadMoreUsers, resetUsers } =
+    useAvailableUsers(open);
 
   // Function to handle the update of the group name.
   const handleGroupNameUpdate = async () => {
@@ -69,21 +69,6 @@ const GroupChatDetailsModal: React.FC<{
     );
   };
 
-  // Function to retrieve available users.
-  const getUsers = async () => {
-    requestHandler(
-      // Call to get the list of available users.
-      async () => await getAvailableUsers(),
-      null,
-      // On successful retrieval, set the users' state.
-      (res) => {
-        const { data } = res;
-        setUsers(data || []);
-      },
-      alert // Use default alert for any error messages.
-    );
-  };
-
   // Function to delete a group chat.
   const deleteGroupChat = async () => {
     // Check if the user is the admin of the group before deletion.
@@ -184,6 +169,7 @@ const GroupChatDetailsModal: React.FC<{
 
   // Function to handle modal or component closure
   const handleClose = () => {
+    resetUsers();
     onClose();
   };
 
@@ -192,9 +178,9 @@ const GroupChatDetailsModal: React.FC<{
     // If the modal or component isn't open, exit early
     if (!open) return;
 
-    // Fetch group information and users when the modal or component opens
+    // Fetch group information when the modal or component opens; users are
+    // fetched by useAvailableUsers
     fetchGroupInformation();
-    getUsers();
   }, [open]); // The effect is dependent on the 'open' state or prop, so it re-runs whenever 'open' changes
 
   return (
@@ -374,6 +360,9 @@ const GroupChatDetailsModal: React.FC<{
                                         label: user.username,
                                         value: user._id,
                                       }))}
+                                      onSearch={searchUsers}
+                                      hasMore={hasMoreUsers}
+                                      onLoadMore={loadMoreUsers}
                                       onChange={({ value }) => {
                                         setParticipantToBeAdded(value);
                                       }}
@@ -137,7 +137,7 @@ const MessageItem: React.FC<{
                       </button>
                       <img
                         className="h-full w-full object-cover"
-                        src={file.url}
+                        src={file.variants?.thumb ?? file.url}
                         alt="msg_img"
                       />
                     </div>
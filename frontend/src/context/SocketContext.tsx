@@ -3,6 +3,10 @@ import React, { createContext, useContext, useEffect, useState } from "react";
 import socketio from "socket.io-client";
 import { LocalStorage } from "../utils";
 
+const HEARTBEAT_EVENT = "heartbeat";
+// Must stay well below the server's PRESENCE_TTL_SECONDS
+const HEARTBEAT_INTERVAL = 30000;
+
 // Function to establish a socket connection with authorization token
 const getSocket = () => {
   const token = LocalStorage.get("token"); // Retrieve jwt token from local storage or cookie
@@ -11,7 +15,9 @@ const getSocket = () => {
   return socketio(import.meta.env.VITE_SOCKET_URI, {
     path: "chat/socket",
     withCredentials: true,
-    auth: { token },
+    // Evaluated on every (re)connect so the server can replay events missed since lastSeq
+    auth: (cb) =>
+      cb({ token, lastSeq: LocalStorage.get("lastSeq") ?? undefined }),
   });
 };
 
@@ -39,6 +45,15 @@ const SocketProvider: React.FC<{ children: React.ReactNode }> = ({
     setSocket(getSocket());
   }, []);
 
+  // Keep the server's presence entry alive while the socket is open
+  useEffect(() => {
+    if (!socket) return;
+    const interval = setInterval(() => {
+      if (socket.connected) socket.emit(HEARTBEAT_EVENT);
+    }, HEARTBEAT_INTERVAL);
+    return () => clearInterval(interval);
+  }, [socket]);
+
   return (
     // Provide the socket instance through context to its children
     <SocketContext.Provider value={{ socket }}>
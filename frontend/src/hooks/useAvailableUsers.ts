@@ -0,0 +1,65 @@
+import { useEffect, useRef, useState } from "react";
+import { getAvailableUsers } from "../api";
+import { UserInterface } from "../interfaces/user";
+import { requestHandler } from "../utils";
+
+// Delay after the last keystroke before the server is searched
+const SEARCH_DELAY = 300;
+
+/**
+ * Users that can be added to a chat, searched on the server by username and
+ * fetched one page at a time. Fetching starts when `open` becomes true.
+ */
+const useAvailableUsers = (open: boolean) => {
+  const [users, setUsers] = useState<UserInterface[]>([]);
+  const [query, setQuery] = useState("");
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [loadingUsers, setLoadingUsers] = useState(false);
+
+  // Only the most recent request may update the list, so a slow response for an
+  // older query can not replace the results of a newer one
+  const latestRequest = useRef(0);
+
+  const fetchUsers = (q: string, cursor?: string) => {
+    const request = ++latestRequest.current;
+    requestHandler(
+      async () => await getAvailableUsers(q || undefined, cursor),
+      setLoadingUsers,
+      (res) => {
+        if (request !== latestRequest.current) return;
+        const { data, nextCursor } = res;
+        // A cursor continues the current results, otherwise they are replaced
+        setUsers((prev) => (cursor ? [...prev, ...(data || [])] : data || []));
+        setNextCursor(nextCursor || null);
+      },
+      alert
+    );
+  };
+
+  useEffect(() => {
+    if (!open) return;
+    const timeout = setTimeout(() => fetchUsers(query), query ? SEARCH_DELAY : 0);
+    return () => clearTimeout(timeout);
+  }, [open, query]);
+
+  const loadMoreUsers = () => {
+    if (nextCursor && !loadingUsers) fetchUsers(query, nextCursor);
+  };
+
+  const resetUsers = () => {
+    latestRequest.current++;
+    setUsers([]);
+    setQuery("");
+    setNextCursor(null);
+  };
+
+  return {
+    users,
+    searchUsers: setQuery,
+    hasMoreUsers: !!nextCursor,
+    loadMoreUsers,
+    resetUsers,
+  };
+};
+
+export default useAvailableUsers;
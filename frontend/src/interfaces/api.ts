@@ -1,5 +1,6 @@
 export interface FreeAPISuccessResponseInterface {
   data: any;
+  nextCursor?: string | null; // Set on paginated lists when more items are available
   message: string;
   statusCode: number;
   success: boolean;
@@ -9,6 +9,7 @@ export interface ChatListItemInterface {
   participants: UserInterface[];
   updatedAt: string;
   _id: string;
+  seq?: number; // Delivery sequence, set on socket events
 }
 
 export interface ChatMessageInterface {
@@ -20,7 +21,9 @@ export interface ChatMessageInterface {
     url: string;
     localPath: string;
     _id: string;
+    variants?: Record<string, string>;
   }[];
   createdAt: string;
   updatedAt: string;
+  seq?: number; // Delivery sequence, set on socket events
 }
@@ -34,9 +34,11 @@ const JOIN_CHAT_EVENT = "joinChat";
 const NEW_CHAT_EVENT = "newChat";
 const TYPING_EVENT = "typing";
 const STOP_TYPING_EVENT = "stopTyping";
+const TYPING_USERS_EVENT = "typingUsers";
 const MESSAGE_RECEIVED_EVENT = "messageReceived";
 const LEAVE_CHAT_EVENT = "leaveChat";
 const UPDATE_GROUP_NAME_EVENT = "updateGroupName";
+const REPLAY_EVENT = "replay";
 const MESSAGE_DELETE_EVENT = "messageDeleted";
 // const SOCKET_ERROR_EVENT = "socketError";
 
@@ -50,6 +52,13 @@ const ChatPage = () => {
   // will always refer to the latest value, even if the component re-renders.
   const currentChat = useRef<ChatListItemInterface | null>(null);
 
+  // Deliveries already handled, so replayed events are not applied twice. Keyed by
+  // event, id and seq: sequences from different server workers may coincide.
+  const seenDeliveries = useRef<Set<string>>(new Set());
+
+  // Latest "who is typing" snapshot per chat and per server worker
+  const typingSnapshots = useRef<Record<string, Record<string, string[]>>>({});
+
   // To keep track of the setTimeout function
   const typingTimeoutRef = useRef<ReturnType<typeof setTimeout> | null>(null);
 
@@ -62,6 +71,10 @@ const ChatPage = () => {
 
   const [chats, setChats] = useState<ChatListItemInterface[]>([]); // To store user's chats
   const [messages, setMessages] = useState<ChatMessageInterface[]>([]); // To store chat messages
+  const [olderMessagesCursor, setOlderMessagesCursor] = useState<
+    string | null
+  >(null); // Cursor for the next page of older messages, if there is one
+  const [loadingOlderMessages, setLoadingOlderMessages] = useState(false); // To indicate loading of older messages
   const [unreadMessages, setUnreadMessages] = useState<ChatMessageInterface[]>(
     []
   ); // To track unread messages
@@ -149,6 +162,8 @@ const ChatPage = () => {
       unreadMessages.filter((msg) => msg.chat !== currentChat.current?._id)
     );
 
+    setOlderMessagesCursor(null);
+
     // Make an async request to fetch chat messages for the current chat
     requestHandler(
       // Fetching messages for the current chat
@@ -157,14 +172,39 @@ const ChatPage = () => {
       setLoadingMessages,
       // After fetching, set the chat messages to the state if available
       (res) => {
-        const { data } = res;
+        const { data, nextCursor } = res;
         setMessages(data || []);
+        setOlderMessagesCursor(nextCursor || null);
       },
       // Display any error alerts if they occur during the fetch
       alert
     );
   };
 
+  // Fetches the page of messages before the oldest one loaded so far
+  const getOlderMessages = async () => {
+    const chatId = currentChat.current?._id;
+    if (!chatId || !olderMessagesCursor || loadingOlderMessages) return;
+
+    requestHandler(
+      async () => await getChatMessages(chatId, olderMessagesCursor),
+      setLoadingOlderMessages,
+      (res) => {
+        // Ignore the page if another chat was opened in the meantime
+        if (currentChat.current?._id !== chatId) return;
+        const { data, nextCursor } = res;
+        setMessages((prev) => [
+          ...prev,
+          ...(data || []).filter(
+            (msg: ChatMessageInterface) => !prev.some((m) => m._id === msg._id)
+          ),
+        ]);
+        setOlderMessagesCursor(nextCursor || null);
+      },
+      alert
+    );
+  };
+
   // Function to send a chat message
   const sendChatMessage = async () => {
     // If no current chat ID exists or there's no socket connection, exit the function
@@ -248,30 +288,77 @@ const ChatPage = () => {
     setIsConnected(true);
   };
 
-  const onDisconnect = () => {
-    setIsConnected(false);
+  // Records a delivery; returns false if the event was already handled
+  const trackDelivery = (event: string, id: string, seq?: number) => {
+    if (seq === undefined) return true;
+    const key = `${event}:${id}:${seq}`;
+    if (seenDeliveries.current.has(key)) return false;
+    seenDeliveries.current.add(key);
+    if (seq > (LocalStorage.get("lastSeq") ?? 0)) LocalStorage.set("lastSeq", seq);
+    return true;
   };
 
   /**
-   * Handles the "typing" event on the socket.
+   * Handles the batch of events missed while disconnected, sent right after connecting.
    */
-  const handleOnSocketTyping = (chatId: string) => {
-    // Check if the typing event is for the currently active chat.
-    if (chatId !== currentChat.current?._id) return;
+  const onReplay = ({
+    events,
+    truncated,
+    lastSeq,
+  }: {
+    events: { seq: number; event: string; payload: unknown }[];
+    truncated: boolean;
+    lastSeq: number;
+  }) => {
+    events.forEach(({ event, payload }) => {
+      if (event === MESSAGE_RECEIVED_EVENT)
+        onMessageReceived(payload as ChatMessageInterface);
+      else if (event === NEW_CHAT_EVENT)
+        onNewChat(payload as ChatListItemInterface);
+      else if (event === LEAVE_CHAT_EVENT)
+        onChatLeave(payload as ChatListItemInterface);
+    });
+    if (lastSeq > (LocalStorage.get("lastSeq") ?? 0)) LocalStorage.set("lastSeq", lastSeq);
+
+    // Too much was missed to replay, fall back to refetching
+    if (truncated) {
+      getChats();
+      if (currentChat.current?._id) getMessages();
+    }
+  };
 
-    // Set the typing state to true for the current chat.
-    setIsTyping(true);
+  const onDisconnect = () => {
+    setIsConnected(false);
   };
 
   /**
-   * Handles the "stop typing" event on the socket.
+   * Handles the "typingUsers" snapshot the server sends when the set of typers in a chat changes.
    */
-  const handleOnSocketStopTyping = (chatId: string) => {
-    // Check if the stop typing event is for the currently active chat.
+  const handleOnSocketTypingUsers = ({
+    chatId,
+    users,
+    origin,
+  }: {
+    chatId: string;
+    users: string[];
+    origin: string;
+  }) => {
+    // Each server worker only reports the typers on its own sockets, so keep the
+    // latest snapshot per origin and treat their union as the chat's typers.
+    const snapshots = typingSnapshots.current[chatId] ?? {};
+    typingSnapshots.current[chatId] = snapshots;
+    if (users.length) snapshots[origin] = users;
+    else delete snapshots[origin];
+
+    // Check if the snapshot is for the currently active chat.
     if (chatId !== currentChat.current?._id) return;
 
-    // Set the typing state to false for the current chat.
-    setIsTyping(false);
+    // Someone other than the current user is typing.
+    setIsTyping(
+      Object.values(snapshots).some((typers) =>
+        typers.some((userId) => userId !== user?._id)
+      )
+    );
   };
 
   const onMessageDelete = (message: ChatMessageInterface) => {
@@ -290,13 +377,20 @@ const ChatPage = () => {
    * Handles the event when a new message is received.
    */
   const onMessageReceived = (message: ChatMessageInterface) => {
+    if (!trackDelivery(MESSAGE_RECEIVED_EVENT, message._id, message.seq)) return;
+
     // Check if the received message belongs to the currently active chat
     if (message?.chat !== currentChat.current?._id) {
-      // If not, update the list of unread messages
-      setUnreadMessages((prev) => [message, ...prev]);
+      // If not, update the list of unread messages (replays may repeat a message)
+      setUnreadMessages((prev) =>
+        prev.some((m) => m._id === message._id) ? prev : [message, ...prev]
+      );
     } else {
       // If it belongs to the current chat, update the messages list for the active chat
-      setMessages((prev) => [message, ...prev]);
+      // (skipping messages already fetched before a replay arrived)
+      setMessages((prev) =>
+        prev.some((m) => m._id === message._id) ? prev : [message, ...prev]
+      );
     }
 
     // Update the last message for the chat to which the received message belongs
@@ -304,11 +398,13 @@ const ChatPage = () => {
   };
 
   const onNewChat = (chat: ChatListItemInterface) => {
-    setChats((prev) => [chat, ...prev]);
+    if (!trackDelivery(NEW_CHAT_EVENT, chat._id, chat.seq)) return;
+    setChats((prev) => [chat, ...prev.filter((c) => c._id !== chat._id)]);
   };
 
   // This function handles the event when a user leaves a chat.
-  const onChatLeave = (chat: ChatListItemInterface) => {
+  const onChatLeave = (chat: Pick<ChatListItemInterface, "_id" | "seq">) => {
+    if (!trackDelivery(LEAVE_CHAT_EVENT, chat._id, chat.seq)) return;
     // Check if the chat the user is leaving is the current active chat.
     if (chat._id === currentChat.current?._id) {
       // If the user is in the group chat they're leaving, close the chat window.
@@ -321,23 +417,24 @@ const ChatPage = () => {
   };
 
   // Function to handle changes in group name
-  const onGroupNameChange = (chat: ChatListItemInterface) => {
+  // The server only sends the chat id and the new name
+  const onGroupNameChange = (chat: Pick<ChatListItemInterface, "_id" | "name">) => {
     // Check if the chat being changed is the currently active chat
-    if (chat._id === currentChat.current?._id) {
-      // Update the current chat with the new details
-      currentChat.current = chat;
+    if (currentChat.current && chat._id === currentChat.current._id) {
+      // Update the current chat with the new name
+      currentChat.current = { ...currentChat.current, name: chat.name };
 
       // Save the updated chat details to local storage
-      LocalStorage.set("currentChat", chat);
+      LocalStorage.set("currentChat", currentChat.current);
     }
 
-    // Update the list of chats with the new chat details
+    // Update the list of chats with the new chat name
     setChats((prev) => [
       // Map through the previous chats
       ...prev.map((c) => {
-        // If the current chat in the map matches the chat being changed, return the updated chat
+        // If the current chat in the map matches the chat being changed, update its name
         if (c._id === chat._id) {
-          return chat;
+          return { ...c, name: chat.name };
         }
         // Otherwise, return the chat as-is without any changes
         return c;
@@ -372,12 +469,12 @@ const ChatPage = () => {
     // Set up event listeners for various socket events:
     // Listener for when the socket connects.
     socket.on(CONNECTED_EVENT, onConnect);
+    // Listener for events missed while disconnected.
+    socket.on(REPLAY_EVENT, onReplay);
     // Listener for when the socket disconnects.
     socket.on(DISCONNECT_EVENT, onDisconnect);
-    // Listener for when a user is typing.
-    socket.on(TYPING_EVENT, handleOnSocketTyping);
-    // Listener for when a user stops typing.
-    socket.on(STOP_TYPING_EVENT, handleOnSocketStopTyping);
+    // Listener for who is typing in a chat.
+    socket.on(TYPING_USERS_EVENT, handleOnSocketTypingUsers);
     // Listener for when a new message is received.
     socket.on(MESSAGE_RECEIVED_EVENT, onMessageReceived);
     // Listener for the initiation of a new chat.
@@ -392,9 +489,9 @@ const ChatPage = () => {
     return () => {
       // Remove all the event listeners we set up to avoid memory leaks and unintended behaviors.
       socket.off(CONNECTED_EVENT, onConnect);
+      socket.off(REPLAY_EVENT, onReplay);
       socket.off(DISCONNECT_EVENT, onDisconnect);
-      socket.off(TYPING_EVENT, handleOnSocketTyping);
-      socket.off(STOP_TYPING_EVENT, handleOnSocketStopTyping);
+      socket.off(TYPING_USERS_EVENT, handleOnSocketTypingUsers);
       socket.off(MESSAGE_RECEIVED_EVENT, onMessageReceived);
       socket.off(NEW_CHAT_EVENT, onNewChat);
       socket.off(LEAVE_CHAT_EVENT, onChatLeave);
@@ -575,6 +672,18 @@ const ChatPage = () => {
                         />
                       );
                     })}
+                    {/* Rendered last so it shows above the oldest message in the reversed column */}
+                    {olderMessagesCursor ? (
+                      <button
+                        onClick={getOlderMessages}
+                        disabled={loadingOlderMessages}
+                        className="self-center rounded-xl bg-dark hover:bg-secondary text-sm px-4 py-2 disabled:opacity-50"
+                      >
+                        {loadingOlderMessages
+                          ? "Loading..."
+                          : "Load older messages"}
+                      </button>
+                    ) : null}
                   </>
                 )}
               </div>